@@ -13,4 +13,4 @@ __version__ = "0.8.3"
 __copyright__ = "Copyright © 2005-2012 Red Hat, Inc."
 __license__ = "GPL"
 __all__ = ("config", "predicate",
-           "procedural", "tc", "tree", "utils", "errors")
+           "procedural", "tc", "tree", "utils", "errors", "mirror", "aio", "stats")
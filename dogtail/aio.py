@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+"""
+Asynchronous versions of the tree API
+
+The search, action and input methods of dogtail.tree block the calling thread,
+while retrying with time.sleep() and while waiting for D-Bus replies. This
+module has variants of them that return futures instead, so that a single
+thread can drive many applications at once.
+
+Coroutines are generator functions decorated with @coroutine, that yield
+futures (or lists of futures, which are waited on together) and get their
+results back; they return a value by raising Return(value):
+
+    from dogtail import aio, tree
+
+    @aio.coroutine
+    def openAbout(app):
+        helpMenu = yield aio.child(app, 'Help', roleName='menu')
+        yield aio.click(helpMenu)
+        about = yield aio.child(app, 'About', roleName='menu item')
+        yield aio.doAction(about, 'click')
+        raise aio.Return(about)
+
+    aio.runUntilComplete([openAbout(app) for app in apps])
+
+Everything is scheduled on the default GLib main context, which is also where
+AT-SPI delivers its events, so waiting for an event never blocks anything
+else. Retries back off with sleep(), a timer on the main loop. libatspi only
+makes synchronous D-Bus calls, so those are made from a pool of worker threads
+(see runInExecutor()), with the results handed back to the main loop; the GIL
+is released while a call waits for its reply.
+
+Synthesized input (click(), typeText(), ...) goes to whatever has the focus on
+the display, so it is serialized even when issued from several coroutines.
+"""
+import os
+import sys
+import functools
+import subprocess
+import threading
+import types
+from multiprocessing.pool import ThreadPool
+from time import time
+
+import pyatspi
+from gi.repository import GLib
+from config import config
+import predicate
+from utils import Backoff
+from logging import debugLogger as logger
+
+
+class Return(Exception):
+
+    """
+    Raised by a coroutine to finish with the given value, since generators
+    can't return one.
+    """
+
+    def __init__(self, value=None):
+        Exception.__init__(self)
+        self.value = value
+
+
+class Future(object):
+
+    """
+    The result of an operation that may not have finished yet. Callbacks are
+    always run from the main loop.
+    """
+
+    def __init__(self):
+        self.callbacks = []
+        self.finished = False
+        self.value = None
+        self.excInfo = None
+
+    def done(self):
+        return self.finished
+
+    def result(self):
+        """
+        Get the result of the operation, or raise the exception it failed
+        with.
+        """
+        if not self.finished:
+            raise RuntimeError("The operation hasn't finished yet")
+        if self.excInfo is not None:
+            raise self.excInfo[0], self.excInfo[1], self.excInfo[2]
+        return self.value
+
+    def addDoneCallback(self, callback):
+        """
+        Arrange for callback to be called with the future once it is done.
+        """
+        if self.finished:
+            callback(self)
+        else:
+            self.callbacks.append(callback)
+
+    def setResult(self, value):
+        self.__finish(value, None)
+
+    def setException(self, excInfo):
+        """
+        Fail the operation with the exception described by excInfo, as
+        returned by sys.exc_info().
+        """
+        self.__finish(None, excInfo)
+
+    def __finish(self, value, excInfo):
+        if self.finished:
+            return
+        self.finished = True
+        self.value = value
+        self.excInfo = excInfo
+        callbacks = self.callbacks
+        self.callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+
+class Task(Future):
+
+    """
+    Runs a coroutine's generator, resuming it whenever the future it yielded
+    is done. The task's own result is that of the coroutine.
+    """
+
+    def __init__(self, generator):
+        Future.__init__(self)
+        self.generator = generator
+        self.__step(None)
+
+    def __step(self, future):
+        while True:
+            try:
+                if future is None:
+                    yielded = self.generator.send(None)
+                else:
+                    try:
+                        value = future.result()
+                    except Exception:
+                        yielded = self.generator.throw(*sys.exc_info())
+                    else:
+                        yielded = self.generator.send(value)
+            except (StopIteration, Return) as e:
+                self.setResult(getattr(e, 'value', None))
+                return
+            except Exception:
+                self.setException(sys.exc_info())
+                return
+            future = asFuture(yielded)
+            if not future.done():
+                future.addDoneCallback(self.__step)
+                return
+
+
+def asFuture(value):
+    """
+    Turn what a coroutine may yield (a future, or a list or tuple of them)
+    into a single future.
+    """
+    if isinstance(value, Future):
+        return value
+    if isinstance(value, (list, tuple)):
+        return gather(*value)
+    raise TypeError("Coroutines may only yield futures, not %r" % (value,))
+
+
+def coroutine(function):
+    """
+    Decorator turning a generator function into one returning a Task.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        result = function(*args, **kwargs)
+        if isinstance(result, types.GeneratorType):
+            return Task(result)
+        future = Future()
+        future.setResult(result)
+        return future
+    return wrapper
+
+
+def gather(*futures):
+    """
+    Get a future for the list of results of all of the given futures. It
+    fails as soon as any of them does.
+    """
+    futures = [asFuture(future) for future in futures]
+    gathered = Future()
+    remaining = [len(futures)]
+
+    def finished(future):
+        if future.excInfo is not None:
+            gathered.setException(future.excInfo)
+            return
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            gathered.setResult([each.value for each in futures])
+    if not futures:
+        gathered.setResult([])
+    for future in futures:
+        future.addDoneCallback(finished)
+    return gathered
+
+
+def sleep(seconds, result=None):
+    """
+    Get a future that is done, with the given result, after the given number
+    of seconds.
+    """
+    future = Future()
+
+    def expire():
+        future.setResult(result)
+        return False
+    GLib.timeout_add(int(seconds * 1000), expire)
+    return future
+
+
+def waitForEvent(eventTypes, filter=None, timeout=None):
+    """
+    Get a future for the next AT-SPI event of one of the given types for
+    which filter (if given) returns True, or for None if timeout seconds pass
+    first.
+    """
+    future = Future()
+
+    def listener(event):
+        try:
+            if filter is not None and not filter(event):
+                return
+        except Exception:
+            return
+        if config.debugEvents:
+            logger.log("event: %s" % str(event))
+        future.setResult(event)
+
+    def expire():
+        sourceIds.pop()
+        future.setResult(None)
+        return False
+
+    def cleanUp(future):
+        for eventType in eventTypes:
+            pyatspi.Registry.deregisterEventListener(listener, eventType)
+        for sourceId in sourceIds:
+            GLib.source_remove(sourceId)
+
+    for eventType in eventTypes:
+        pyatspi.Registry.registerEventListener(listener, eventType)
+    sourceIds = []
+    if timeout is not None:
+        sourceIds.append(GLib.timeout_add(int(timeout * 1000), expire))
+    future.addDoneCallback(cleanUp)
+    return future
+
+
+executorSize = 16
+executor = None
+executorLock = threading.Lock()
+
+
+def runInExecutor(function, *args, **kwargs):
+    """
+    Call the (blocking) function on a worker thread, and get a future for
+    its result.
+    """
+    global executor
+    with executorLock:
+        if executor is None:
+            executor = ThreadPool(executorSize)
+    future = Future()
+
+    def deliver(value, excInfo):
+        if excInfo is None:
+            future.setResult(value)
+        else:
+            future.setException(excInfo)
+        return False
+
+    def call():
+        try:
+            value = function(*args, **kwargs)
+        except Exception:
+            GLib.idle_add(deliver, None, sys.exc_info())
+        else:
+            GLib.idle_add(deliver, value, None)
+    executor.apply_async(call)
+    return future
+
+
+inputLock = threading.Lock()
+
+
+def runInput(function, *args, **kwargs):
+    """
+    Like runInExecutor(), but never runs two input operations at once.
+    """
+    def withLock():
+        with inputLock:
+            return function(*args, **kwargs)
+    return runInExecutor(withLock)
+
+
+def runUntilComplete(future):
+    """
+    Run the main loop until the future (or list of futures) is done, and
+    return its result.
+    """
+    future = asFuture(future)
+    if not future.done():
+        loop = GLib.MainLoop()
+        future.addDoneCallback(lambda future: loop.quit())
+        loop.run()
+    return future.result()
+
+
+@coroutine
+def findChild(node, pred, recursive=True, debugName=None, retry=True,
+              requireResult=True, strategy=None, maxDepth=None, prune=None,
+              threads=None, timeout=None):
+    """
+    Like Node.findChild(), but the searching is done on a worker thread, and
+    retries wait on the main loop.
+    """
+    from tree import SearchError, searchEventTypes
+    assert isinstance(pred, predicate.Predicate)
+    if debugName is None:
+        debugName = pred.describeSearchResult()
+    numAttempts = 0
+    backoff = Backoff(timeout)
+    while True:
+        if backoff.warningDue() or config.debugSearching:
+            logger.log("searching for %s (attempt %i)" % (debugName, numAttempts))
+        result = yield runInExecutor(node._fastFindChild, pred, recursive,
+                                     strategy, maxDepth, prune, threads)
+        if result:
+            result.debugName = debugName
+            raise Return(result)
+        numAttempts += 1
+        delay = backoff.next()
+        if not retry or delay <= 0:
+            break
+        if config.searchWaitForEvents:
+            yield waitForEvent(searchEventTypes, None, delay)
+        else:
+            yield sleep(delay)
+    if requireResult:
+        noun = "descendent" if recursive else "child"
+        raise SearchError("%s of %s: %s" % (noun, node.getLogString(), debugName))
+    raise Return(None)
+
+
+def child(node, name='', roleName='', description='', label='', recursive=True,
+          retry=True, debugName=None, strategy=None, maxDepth=None, prune=None,
+          timeout=None):
+    """
+    Like Node.child(), returning a future.
+    """
+    return findChild(node, predicate.GenericPredicate(
+        name=name, roleName=roleName, description=description, label=label),
+        recursive=recursive, retry=retry, debugName=debugName,
+        strategy=strategy, maxDepth=maxDepth, prune=prune, timeout=timeout)
+
+
+def findChildren(node, pred, recursive=True, isLambda=False, strategy=None,
+                 maxDepth=None, prune=None, threads=None):
+    """
+    Like Node.findChildren(), returning a future.
+    """
+    return runInExecutor(node.findChildren, pred, recursive, isLambda,
+                         strategy, maxDepth, prune, threads)
+
+
+def do(action):
+    """
+    Like Action.do(), returning a future.
+    """
+    return runInExecutor(action.do)
+
+
+def doAction(node, name):
+    """
+    Like Node.doActionNamed(), returning a future.
+    """
+    return runInExecutor(node.doActionNamed, name)
+
+
+def click(node, button=1):
+    """
+    Like Node.click(), returning a future.
+    """
+    return runInput(node.click, button)
+
+
+def typeText(node, string):
+    """
+    Like Node.typeText(), returning a future.
+    """
+    return runInput(node.typeText, string)
+
+
+@coroutine
+def run(string, timeout=None, interval=None, desktop=None, dumb=False,
+        appName=''):
+    """
+    Like utils.run(), returning a future for the pid of the application.
+    """
+    from utils import findStartedApplication, startupEventApplication, \
+        startupEventTypes, startupTimes
+    if timeout is None:
+        timeout = config.runTimeout
+    if interval is None:
+        interval = config.runInterval
+    args = string.split()
+    os.environ['GTK_MODULES'] = 'gail:atk-bridge'
+    startTime = time()
+    pid = subprocess.Popen(args, env=os.environ).pid
+    if not appName:
+        appName = args[0]
+    if dumb:
+        yield sleep(timeout)
+        raise Return(pid)
+    if not desktop:
+        from tree import root as desktop
+    deadline = startTime + timeout
+    while True:
+        app = yield runInExecutor(findStartedApplication, desktop, appName, pid)
+        if app is not None:
+            startupTimes[pid] = time() - startTime
+            logger.log("%s (pid %d) created its first window after %.3fs" %
+                       (appName, pid, startupTimes[pid]))
+            from procedural import focus
+            focus.application.node = app
+            break
+        remaining = deadline - time()
+        if remaining <= 0:
+            break
+        yield waitForEvent(startupEventTypes,
+                           lambda event: startupEventApplication(
+                               event, pid, appName) is not None,
+                           min(interval, remaining))
+    raise Return(pid)
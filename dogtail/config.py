@@ -39,6 +39,14 @@ class _Config(object):
     typingDelay(float):
     The delay after a character is typed on the keyboard.
 
+    typingBatchSize(int):
+    How many characters to type on the keyboard before each typingDelay.
+
+    typeTextMethod(str):
+    How Node.typeText() enters text: 'keys' types it on the keyboard, while
+    'insert' inserts it through the AT-SPI EditableText interface in one go,
+    checks that it arrived, and only types it if it didn't.
+
     runInterval(float):
     The interval at which dogtail.utils.run() and dogtail.procedural.run()
     check to see if the application has started up.
@@ -47,18 +55,83 @@ class _Config(object):
     The timeout after which dogtail.utils.run() and dogtail.procedural.run()
     give up on looking for the newly-started application.
 
+    searchTimeout (float):
+    Time in seconds after which a failing search gives up, however many
+    attempts that took. If None, it is searchCutoffCount times
+    searchBackoffDuration.
+
+    searchBackoffInitial (float):
+    Time in seconds for which to delay after a search first fails.
+
+    searchBackoffFactor (float):
+    How much longer to delay after each further failure.
+
     searchBackoffDuration (float):
-    Time in seconds for which to delay when a search fails.
+    The longest time in seconds for which to delay when a search fails.
+
+    searchBackoffJitter (float):
+    The fraction by which each delay is randomly lengthened or shortened.
 
     searchWarningThreshold (int):
-    Number of retries before logging the individual attempts at a search.
+    Number of times searchBackoffDuration a search has to go on failing for
+    before its individual attempts are logged.
 
     searchCutoffCount (int):
-    Number of times to retry when a search fails.
+    Used to compute the default searchTimeout, for compatibility with the
+    time it took to give up when searches were retried a fixed number of
+    times.
+
+    searchStrategy (str):
+    The order in which recursive searches visit nodes: 'dfs' (depth-first)
+    or 'bfs' (breadth-first).
+
+    searchMaxDepth (int):
+    How many levels below the starting node recursive searches descend, or
+    None for no limit.
+
+    searchUseCollection (boolean):
+    Whether recursive searches for predicates that require particular roles
+    should ask the application for the nodes having those roles (using the
+    AT-SPI Collection interface), rather than walking the whole tree.
+
+    searchUseLabelIndex (boolean):
+    Whether recursive findChild() searches for nodes by label (e.g.
+    child(label='Name:')) should first look for the labels with that name, and
+    check the nodes they are labels for, rather than every node's labels.
+    Falls back to walking the tree if none of those nodes match. Searches for
+    all matching nodes (findChildren()) always walk the tree.
+
+    searchWaitForEvents (boolean):
+    Whether a failed search should be retried as soon as a relevant AT-SPI
+    event (children-changed, name change, window creation) arrives from below
+    the search root, instead of always sleeping for searchBackoffDuration. The
+    backoff duration is then only used as a fallback deadline.
+
+    searchThreads (int):
+    How many threads recursive searches that have to walk the tree are spread
+    across. libatspi's connection to the applications isn't thread-safe, so
+    the threads take turns at calling the applications. Results are the same,
+    in the same order, as with a single thread (the default).
 
     defaultDelay (float):
     Default time in seconds to sleep when delaying.
 
+    settleAfterActions (boolean):
+    Whether actions, clicks and selections should, instead of sleeping for
+    actionDelay or defaultDelay afterwards, only wait until the application
+    has stopped emitting AT-SPI events for settleQuietPeriod seconds (or
+    until the expected change has happened). The delays then only act as an
+    upper bound.
+
+    settleQuietPeriod (float):
+    How long in seconds an application has to be quiet to count as settled.
+
+    cacheLiveness (boolean):
+    Whether Node.dead should remember which nodes were alive, until an AT-SPI
+    event signals that a node may have died. This saves the check in loops
+    polling for a node to die. Turning it off stops the listening for those
+    events.
+
     childrenLimit (int):
     When there are a very large number of children of a node, only return
     this many, starting with the first.
@@ -69,6 +142,13 @@ class _Config(object):
     debugSleep (boolean):
     Whether to log whenever we sleep to the debug log.
 
+    debugEvents (boolean):
+    Whether to log the AT-SPI events that wake up waits to the debug log.
+
+    debugSearchStats (boolean):
+    Whether to log the statistics of every search (time taken, nodes visited,
+    calls made) while a dogtail.stats.Stats is collecting them.
+
     debugSearchPaths (boolean):
     Whether we should write out debug info when running the SearchPath
     routines.
@@ -127,17 +207,34 @@ class _Config(object):
         # Timing and Limits
         'actionDelay': 1.0,
         'typingDelay': 0.1,
+        'typingBatchSize': 1,
+        'typeTextMethod': 'keys',
         'runInterval': 0.5,
         'runTimeout': 30,
+        'searchTimeout': None,
+        'searchBackoffInitial': 0.01,
+        'searchBackoffFactor': 2.0,
         'searchBackoffDuration': 0.5,
+        'searchBackoffJitter': 0.1,
         'searchWarningThreshold': 3,
         'searchCutoffCount': 20,
+        'searchStrategy': 'dfs',
+        'searchMaxDepth': None,
+        'searchUseCollection': True,
+        'searchUseLabelIndex': True,
+        'searchWaitForEvents': False,
+        'searchThreads': 1,
         'defaultDelay': 0.5,
+        'settleAfterActions': False,
+        'settleQuietPeriod': 0.1,
+        'cacheLiveness': False,
         'childrenLimit': 100,
 
         # Debug
         'debugSearching': False,
         'debugSleep': False,
+        'debugEvents': False,
+        'debugSearchStats': False,
         'debugSearchPaths': False,
         'logDebugToStdOut': True,
         'absoluteNodePaths': False,
@@ -173,6 +270,8 @@ class _Config(object):
             elif name == 'logDebugToFile':
                 import logging
                 logging.debugLogger = logging.Logger('debug', value)
+            elif name == 'cacheLiveness' and not value:
+                _Config.__clearLivenessCache()
             _Config.options[name] = value
 
     def __getattr__(self, name):
@@ -203,6 +302,16 @@ class _Config(object):
                 os.makedirs(dirName)  # pragma: no cover
     __createDir = classmethod(__createDir)
 
+    def __clearLivenessCache(cls):
+        """
+        Make the liveness cache stop listening for events, if it was in use
+        (which it can't be unless dogtail.events has been imported).
+        """
+        events = sys.modules.get('dogtail.events')
+        if events is not None:
+            events.livenessCache.clear()
+    __clearLivenessCache = classmethod(__clearLivenessCache)
+
     def load(self, dict):
         """
         Loads values from dict, preserving any options already set that are not overridden.
@@ -214,6 +323,8 @@ class _Config(object):
         Resets all settings to their defaults.
         """
         _Config.options = {}
+        if not _Config.defaults['cacheLiveness']:
+            _Config.__clearLivenessCache()
 
 
 config = _Config()
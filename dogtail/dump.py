@@ -16,7 +16,7 @@ def plain(node, fileName=None):
         dump(node, depth)
         for action in node.actions.values():
             dump(action, depth + 1)
-        for child in node.children:
+        for child in node.iterChildren(hypertext=True):
             crawl(child, depth + 1)
 
     def dumpFile(item, depth):
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Waiting on AT-SPI events
+
+Rather than sleeping for a fixed amount of time and hoping that the UI has
+caught up in the meantime, code can listen for the AT-SPI events that signal
+the change it is interested in, and carry on as soon as one arrives. The fixed
+delay is then only used as an upper bound.
+
+Likewise, rather than sleeping for a fixed time after every action, settling()
+waits until the application stops emitting events, or until the change the
+action was expected to cause has happened.
+
+AT-SPI delivers events through the default GLib main context, so waiting is
+implemented by iterating that context until either a relevant event or a
+timeout source fires.
+"""
+import pyatspi
+from contextlib import contextmanager
+from gi.repository import GLib
+from time import time
+from config import config
+from utils import doDelay
+from logging import debugLogger as logger
+
+# Everything an application does in response to an action:
+settleEventTypes = ('object:', 'window:', 'focus:')
+
+# The events signalling that nodes may have died:
+deathEventTypes = ('object:children-changed:remove',
+                   'object:state-changed:defunct')
+
+
+def pumpEvents():
+    """
+    Dispatch all of the events that are currently queued on the default main
+    context, without blocking.
+    """
+    context = GLib.MainContext.default()
+    while context.pending():
+        context.iteration(False)
+
+
+class EventWaiter(object):
+
+    """
+    Listens for a set of AT-SPI event types, and allows the caller to block
+    until a relevant event arrives or a timeout expires.
+
+    eventTypes is a sequence of event type strings, as accepted by
+    pyatspi.Registry.registerEventListener(), e.g. 'object:children-changed'.
+
+    filter, if given, is a callable taking the event and returning whether it
+    is relevant; irrelevant events are ignored.
+
+    Instances can be used as context managers, which registers the listeners
+    on entry and deregisters them on exit.
+    """
+
+    def __init__(self, eventTypes, filter=None):
+        self.eventTypes = tuple(eventTypes)
+        self.filter = filter
+        self.triggered = False
+        self.registered = False
+        self.lastEvent = None
+        self.lastEventTime = None
+        # Keep a single bound method around, so that deregistration is handed
+        # the very same callable that was registered:
+        self.__callback = self.__listener
+
+    def __listener(self, event):
+        try:
+            if self.filter is not None and not self.filter(event):
+                return
+        except Exception:
+            # The source of the event may already be gone; that can never
+            # make the event relevant.
+            return
+        self.triggered = True
+        self.lastEvent = event
+        self.lastEventTime = time()
+        if config.debugEvents:
+            logger.log("event: %s" % str(event))
+
+    def register(self):
+        """
+        Start listening for the event types.
+        """
+        if self.registered:
+            return
+        for eventType in self.eventTypes:
+            pyatspi.Registry.registerEventListener(self.__callback, eventType)
+        self.registered = True
+
+    def deregister(self):
+        """
+        Stop listening for the event types.
+        """
+        if not self.registered:
+            return
+        for eventType in self.eventTypes:
+            pyatspi.Registry.deregisterEventListener(
+                self.__callback, eventType)
+        self.registered = False
+
+    def __enter__(self):
+        self.register()
+        return self
+
+    def __exit__(self, *args):
+        self.deregister()
+        return False
+
+    def reset(self):
+        """
+        Forget about any event that has been received so far.
+        """
+        self.triggered = False
+
+    def wait(self, timeout):
+        """
+        Block until a relevant event has been received, or until timeout
+        seconds have passed.
+
+        Returns True if a relevant event was received, False on timeout. Any
+        event received since the last call (or the last reset()) counts, so
+        an event arriving between a failed check and the call to wait() is
+        not lost.
+        """
+        if not self.triggered and timeout > 0:
+            context = GLib.MainContext.default()
+            expired = []
+
+            def expire():
+                expired.append(True)
+                return False
+            sourceId = GLib.timeout_add(int(timeout * 1000), expire)
+            try:
+                while not self.triggered and not expired:
+                    context.iteration(True)
+            finally:
+                if not expired:
+                    GLib.source_remove(sourceId)
+        result = self.triggered
+        self.triggered = False
+        return result
+
+
+@contextmanager
+def settling(node=None, delay=None, until=None):
+    """
+    Context manager for performing an action and then waiting for its
+    effects, for up to delay seconds (config.actionDelay by default).
+
+    If config.settleAfterActions is False, this simply sleeps for delay
+    seconds afterwards. Otherwise, the wait ends as soon as the application of
+    the given node (or, without a node, every application) has emitted no
+    events for config.settleQuietPeriod seconds, or as soon as until (a
+    function, if given) returns True.
+    """
+    if delay is None:
+        delay = config.actionDelay
+    if not config.settleAfterActions:
+        yield
+        doDelay(delay)
+        return
+    eventFilter = None
+    if node is not None:
+        application = node.getApplication()
+
+        def eventFilter(event):
+            return event.host_application == application
+    # Listen from before the action, so that none of its effects are missed:
+    waiter = EventWaiter(settleEventTypes, eventFilter)
+    waiter.register()
+    try:
+        yield
+        settle(waiter, delay, until)
+    finally:
+        waiter.deregister()
+
+
+def settle(waiter, delay, until=None):
+    """
+    Wait, for up to delay seconds, until the registered waiter has received
+    no events for config.settleQuietPeriod seconds, or until returns True.
+    Returns False if the full delay passed.
+    """
+    deadline = time() + delay
+    quietPeriod = config.settleQuietPeriod
+    while True:
+        if until is not None:
+            try:
+                if until():
+                    return True
+            except Exception:
+                pass
+        remaining = deadline - time()
+        if remaining <= 0:
+            if config.debugSleep:
+                logger.log("still not settled after %f" % delay)
+            return False
+        if not waiter.wait(min(quietPeriod, remaining)) and \
+                remaining >= quietPeriod:
+            if config.debugSleep:
+                logger.log("settled after %f" % (delay - remaining +
+                                                 quietPeriod))
+            return True
+
+
+class LivenessCache(object):
+
+    """
+    Remembers which nodes were alive when last checked, until an event
+    arrives that signals that some node (anywhere) may have died: a child
+    being removed, or an object becoming defunct. Only live nodes are
+    remembered, since those are what polling loops check over and over.
+
+    It starts listening for those events when first used, and stops when
+    config.cacheLiveness is turned off.
+    """
+
+    def __init__(self):
+        self.alive = set()
+        self.waiter = EventWaiter(deathEventTypes)
+
+    def isAlive(self, node, probe):
+        """
+        Is the node alive? probe is called on nodes that aren't known to
+        be, and should return whether they are.
+        """
+        if not self.waiter.registered:
+            self.waiter.register()
+        pumpEvents()
+        if self.waiter.triggered:
+            self.alive.clear()
+            self.waiter.reset()
+        if node in self.alive:
+            return True
+        if probe(node):
+            self.alive.add(node)
+            return True
+        return False
+
+    def clear(self):
+        self.alive.clear()
+        self.waiter.deregister()
+
+
+livenessCache = LivenessCache()
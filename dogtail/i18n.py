@@ -12,6 +12,8 @@ import config
 import os
 import re
 import gettext
+import threading
+from collections import OrderedDict
 
 from logging import debugLogger as logger
 from __builtin__ import unicode
@@ -122,6 +124,84 @@ def translate(srcString):
     return results.keys()
 
 
+# Characters that turn a search string into a regular expression. Parentheses
+# are not included: they are always escaped, since grouping is never needed.
+regexMetaCharacters = re.compile(r'[.^$*+?{}\[\]\\|]')
+
+# Compiled patterns are shared between all TranslatableString instances, with
+# the least recently used ones being dropped once there are this many:
+patternCacheSize = 512
+_patternCache = OrderedDict()
+_patternCacheLock = threading.Lock()
+
+
+def compilePattern(string):
+    """
+    Get the compiled regular expression used to match against the given
+    search string, compiling it only if it isn't in the cache already.
+
+    The whole of the tested string has to match, and parentheses (and a
+    leading asterisk) are taken literally.
+    """
+    with _patternCacheLock:
+        try:
+            pattern = _patternCache.pop(string)
+        except KeyError:
+            pattern = None
+        if pattern is not None:
+            _patternCache[string] = pattern
+            return pattern
+    regex = string + '$'
+    if regex[0] == '*':
+        regex = "\\" + regex
+    # Escape all parentheses, since grouping will never be needed here
+    regex = re.sub('([\(\)])', r'\\\1', regex)
+    pattern = re.compile(regex)
+    with _patternCacheLock:
+        _patternCache[string] = pattern
+        while len(_patternCache) > patternCacheSize:
+            _patternCache.popitem(last=False)
+    return pattern
+
+
+class StringMatcher(object):
+
+    """
+    Matches strings against a single search string, which may be a regular
+    expression. Plain strings are compared directly, without going through
+    the regular expression engine.
+    """
+
+    def __init__(self, string):
+        self.string = safeDecode(string)
+        self.pattern = None
+        if regexMetaCharacters.search(self.string):
+            try:
+                self.pattern = compilePattern(self.string)
+            except re.error:
+                # Not a valid regular expression after all; it can still be
+                # matched exactly.
+                pass
+
+    @property
+    def isLiteral(self):
+        """
+        Whether only strings equal to the search string can match.
+        """
+        return self.pattern is None
+
+    def matches(self, string):
+        """
+        Does the (already decoded) string match?
+        """
+        if string == self.string:
+            return True
+        if self.pattern is None:
+            # '$' also matches before a trailing newline:
+            return string == self.string + '\n'
+        return self.pattern.match(string) is not None
+
+
 class TranslatableString(object):
 
     """
@@ -140,49 +220,34 @@ class TranslatableString(object):
             untranslatedString = safeDecode(untranslatedString)
         self.untranslatedString = untranslatedString
         self.translatedStrings = translate(untranslatedString)
+        # The translations are tried first, the original string last:
+        self.matchers = [StringMatcher(translatedString)
+                         for translatedString in self.translatedStrings]
+        self.matchers.append(StringMatcher(untranslatedString))
+
+    @property
+    def isLiteral(self):
+        """
+        Whether the string (and all of its translations) can only be matched
+        exactly, i.e. none of them is a regular expression.
+        """
+        for matcher in self.matchers:
+            if not matcher.isLiteral:
+                return False
+        return True
 
     def matchedBy(self, string):
         """
         Compare the test string against either the translation of the original
         string (or simply the original string, if no translation was found).
         """
-        # print "comparing %s against %s"%(string, self)
-        def stringsMatch(inS, outS):
-            """
-            Compares a regular expression to a string
-
-            inS: the regular expression (or normal string)
-            outS: the normal string to be compared against
-            """
-            inString = str(inS)
-            outString = outS
-            if inString == outString:
+        if string is None:
+            return False
+        string = safeDecode(string)
+        for matcher in self.matchers:
+            if matcher.matches(string):
                 return True
-            inString = inString + '$'
-            inString = safeDecode(inString)
-            outString = safeDecode(outString)
-            if inString[0] == '*':
-                inString = "\\" + inString
-            # Escape all parentheses, since grouping will never be needed here
-            inString = re.sub('([\(\)])', r'\\\1', inString)
-            match = re.match(inString, outString)
-            matched = match is not None
-            return matched
-
-        matched = False
-        # the 'ts' variable keeps track of whether we're working with
-        # translated strings. it's only used for debugging purposes.
-        #ts = 0
-        # print string, str(self)
-        for translatedString in self.translatedStrings:
-            #ts = ts + 1
-            matched = stringsMatch(translatedString, string)
-            if not matched:
-                matched = translatedString == string
-            if matched:
-                return matched
-        # ts=0
-        return stringsMatch(self.untranslatedString, string)
+        return False
 
     def __str__(self):
         """
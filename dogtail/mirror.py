@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+"""
+An in-process mirror of an accessible tree
+
+Every search over the live tree costs several D-Bus round trips per node it
+visits. A TreeMirror walks the tree below a node (typically an application)
+once, remembering the structure and the properties that predicates look at,
+and then keeps itself up to date from the AT-SPI events the application emits
+when children are added or removed, or names, descriptions or states change.
+This is the same idea as sniff's SniffModel, but headless.
+
+The mirror also keeps indexes of its nodes by name, by role and name, and by
+role. Searches for predicates that
+declare an exact name or label (see predicate.Predicate.requiredName), like
+IsAButtonNamed("OK"), are then answered by a lookup rather than a walk. Names
+that are regular expressions are matched against the nodes with the right role
+only, if the predicate requires one.
+
+While a mirror is running, Node.findChild(), Node.findChildren() and
+Node.findAncestor() on any of the nodes it contains are answered from the
+mirror instead of over D-Bus:
+
+    from dogtail import mirror
+    appMirror = mirror.TreeMirror(app)
+    appMirror.start()
+    ...
+    appMirror.stop()
+
+AT-SPI delivers events through the default GLib main context, so pending
+events are dispatched before each query is answered. Mirrors may be queried
+from several threads; all access to the mirrored data is serialized.
+"""
+import threading
+from collections import deque
+
+import pyatspi
+from gi.repository import GLib
+from config import config
+from events import pumpEvents
+from i18n import safeDecode
+from predicate import Predicate
+from logging import debugLogger as logger
+
+# The events a mirror listens for to keep itself up to date:
+mirrorEventTypes = ('object:children-changed',
+                    'object:property-change:accessible-name',
+                    'object:property-change:accessible-description',
+                    'object:state-changed:showing',
+                    'object:state-changed:defunct')
+
+# The mirrors that are currently running, and so are used to answer searches:
+activeMirrors = []
+
+
+def mirrorFor(node):
+    """
+    Get the running TreeMirror containing the given node, or None.
+    """
+    for mirror in activeMirrors:
+        if node in mirror:
+            return mirror
+    return None
+
+
+def childrenOf(node):
+    """
+    Get the children of the given node as a list, which is empty if the node
+    has gone away in the meantime.
+    """
+    try:
+        return list(node)
+    except (LookupError, GLib.GError):
+        return []
+
+
+class MirrorEntry(object):
+
+    """
+    The mirrored state of a single node.
+
+    Entries stand in for their Node when handed to predicates: the mirrored
+    properties are answered from memory, and anything else is passed through
+    to the Node itself. The parent of an entry is the parent's entry (or None
+    for the node the mirror was built from), and children is a list of
+    entries.
+    """
+
+    def __init__(self, node, parent):
+        self.node = node
+        self.parent = parent
+        self.children = []
+        self.refresh()
+
+    def refresh(self):
+        """
+        Fetch the mirrored properties from the node.
+        """
+        self.name = self.node.name
+        self.roleName = self.node.roleName
+        self.description = self.node.description
+        self.showing = self.node.showing
+
+    def __getattr__(self, name):
+        return getattr(self.node, name)
+
+    def __str__(self):
+        return str(self.node)
+
+
+class TreeMirror(object):
+
+    """
+    A mirror of the accessible tree below a node, kept up to date from
+    AT-SPI events. See the module documentation.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.rootEntry = None
+        self.entries = {}
+        # Secondary indexes, mapping keys to sets of entries:
+        self.byName = {}
+        self.byRoleName = {}
+        self.byRoleAndName = {}
+        self.lock = threading.RLock()
+        self.running = False
+        self.__callback = self.__eventReceived
+
+    def __contains__(self, node):
+        return node in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def start(self):
+        """
+        Build the mirror, start keeping it up to date, and use it to answer
+        searches.
+        """
+        if self.running:
+            return
+        for eventType in mirrorEventTypes:
+            pyatspi.Registry.registerEventListener(self.__callback, eventType)
+        self.running = True
+        with self.lock:
+            self.entries = {}
+            self.byName = {}
+            self.byRoleName = {}
+            self.byRoleAndName = {}
+            self.rootEntry = self._addSubtree(self.root, None)
+        activeMirrors.append(self)
+        if config.debugSearching:
+            logger.log("Mirroring %s nodes below %s" % (len(self), self.root))
+
+    def stop(self):
+        """
+        Stop keeping the mirror up to date, and stop using it for searches.
+        """
+        if not self.running:
+            return
+        if self in activeMirrors:
+            activeMirrors.remove(self)
+        for eventType in mirrorEventTypes:
+            pyatspi.Registry.deregisterEventListener(
+                self.__callback, eventType)
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+        return False
+
+    def update(self):
+        """
+        Apply the changes announced by any events that are still pending.
+        """
+        pumpEvents()
+
+    def entryFor(self, node):
+        """
+        Get the MirrorEntry of the given node (which must be mirrored).
+        """
+        with self.lock:
+            return self.entries[node]
+
+    def _addSubtree(self, node, parentEntry):
+        """
+        Mirror the given node and everything below it, returning its entry.
+        Must be called with the lock held.
+        """
+        rootEntry = MirrorEntry(node, parentEntry)
+        self._entryAdded(rootEntry)
+        queue = deque([rootEntry])
+        while queue:
+            entry = queue.popleft()
+            for child in childrenOf(entry.node):
+                if child is None or child in self.entries:
+                    continue
+                try:
+                    childEntry = MirrorEntry(child, entry)
+                except (LookupError, GLib.GError):
+                    # Gone already:
+                    continue
+                entry.children.append(childEntry)
+                self._entryAdded(childEntry)
+                queue.append(childEntry)
+        return rootEntry
+
+    def _removeSubtree(self, entry):
+        """
+        Forget about the given entry and everything below it. Must be called
+        with the lock held.
+        """
+        queue = deque([entry])
+        while queue:
+            entry = queue.popleft()
+            queue.extend(entry.children)
+            if self.entries.get(entry.node) is entry:
+                self._entryRemoved(entry)
+
+    def _entryAdded(self, entry):
+        self.entries[entry.node] = entry
+        self._index(entry)
+
+    def _entryRemoved(self, entry):
+        self._unindex(entry)
+        del self.entries[entry.node]
+
+    def _indexKeys(self, entry):
+        """
+        Get the (index, key) pairs the given entry is filed under.
+        """
+        name = safeDecode(entry.name or '')
+        # Exact names also match with a trailing newline:
+        if name.endswith('\n'):
+            name = name[:-1]
+        return [(self.byName, name),
+                (self.byRoleName, entry.roleName),
+                (self.byRoleAndName, (entry.roleName, name))]
+
+    def _index(self, entry):
+        for (index, key) in self._indexKeys(entry):
+            index.setdefault(key, set()).add(entry)
+
+    def _unindex(self, entry):
+        for (index, key) in self._indexKeys(entry):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.discard(entry)
+                if not bucket:
+                    del index[key]
+
+    def _syncChildren(self, entry):
+        """
+        Bring the children of the given entry in line with those of its node,
+        keeping the entries of children that are still there. Must be called
+        with the lock held.
+        """
+        existing = dict((child.node, child) for child in entry.children)
+        children = []
+        for child in childrenOf(entry.node):
+            if child is None:
+                continue
+            childEntry = existing.pop(child, None)
+            if childEntry is None:
+                try:
+                    childEntry = self._addSubtree(child, entry)
+                except (LookupError, GLib.GError):
+                    continue
+            children.append(childEntry)
+        entry.children = children
+        for childEntry in existing.values():
+            self._removeSubtree(childEntry)
+
+    def __eventReceived(self, event):
+        with self.lock:
+            entry = self.entries.get(event.source)
+            if entry is None:
+                return
+            try:
+                self._processEvent(entry, event)
+            except (LookupError, GLib.GError):
+                # The node went away while we were looking at it:
+                if entry is not self.rootEntry:
+                    self._removeSubtree(entry)
+
+    def _processEvent(self, entry, event):
+        """
+        Apply the change announced by an event on a mirrored node. Must be
+        called with the lock held.
+        """
+        if event.type.major == 'children-changed':
+            self._syncChildren(entry)
+        elif event.type.major == 'property-change':
+            self._propertyChanged(entry)
+        elif event.type.major == 'state-changed':
+            if event.type.minor == 'defunct':
+                if entry.parent is not None:
+                    entry.parent.children.remove(entry)
+                    self._removeSubtree(entry)
+            else:
+                entry.showing = bool(event.detail1)
+
+    def _propertyChanged(self, entry):
+        self._unindex(entry)
+        try:
+            entry.refresh()
+        finally:
+            self._index(entry)
+
+    def _indexedCandidates(self, pred):
+        """
+        Get the entries that can possibly satisfy the predicate according to
+        the indexes, or None if the predicate can't be looked up in them.
+        Must be called with the lock held.
+        """
+        def exactStrings(translatableString):
+            if translatableString is None or not translatableString.isLiteral:
+                return None
+            return [matcher.string for matcher in translatableString.matchers]
+
+        def union(index, keys):
+            result = set()
+            for key in keys:
+                result.update(index.get(key, ()))
+            return result
+
+        roleNames = pred.requiredRoleNames
+        names = exactStrings(pred.requiredName)
+        labelTexts = exactStrings(pred.requiredLabel)
+        if names is not None and roleNames:
+            return union(self.byRoleAndName, [(roleName, name)
+                                              for roleName in roleNames
+                                              for name in names])
+        elif names is not None:
+            return union(self.byName, names)
+        elif roleNames:
+            # A regular expression, or no name at all; only the nodes with the
+            # right role need to be checked.
+            return union(self.byRoleName, roleNames)
+        elif labelTexts is not None:
+            # Labels are found by name, and the nodes they label through
+            # their relations:
+            result = set()
+            for label in union(self.byName, labelTexts):
+                try:
+                    targets = label.node.labellee
+                except (LookupError, GLib.GError):
+                    continue
+                if not isinstance(targets, list):
+                    targets = [targets]
+                for target in targets:
+                    entry = self.entries.get(target)
+                    if entry is not None:
+                        result.add(entry)
+            # Not every toolkit sets both ends of the relation, so a node can
+            # be labelled by a label that doesn't say so; walk the tree then.
+            return result or None
+        return None
+
+    def _positionBelow(self, entry, start, prune):
+        """
+        Get the list of child indexes leading from the start entry down to
+        the given entry, or None if it isn't below start, or is hidden from a
+        search by one of its ancestors being pruned. The start entry itself
+        isn't below start, since searches never return the node they start
+        from.
+        """
+        if entry is start:
+            return None
+        position = []
+        while entry is not start:
+            parent = entry.parent
+            if parent is None:
+                return None
+            if parent is not start and prune is not None:
+                try:
+                    if prune(parent):
+                        return None
+                except Exception:
+                    pass
+            try:
+                position.append(parent.children.index(entry))
+            except ValueError:
+                return None
+            entry = parent
+        position.reverse()
+        return position
+
+    def lookup(self, node, pred, strategy='dfs', maxDepth=None, prune=None):
+        """
+        Get the entries below the given node that may satisfy the predicate,
+        in the order a search would visit them, using the indexes rather than
+        walking the mirror. The predicate still has to be checked on each of
+        them.
+
+        Returns None if the predicate can't be looked up in the indexes.
+        """
+        if not isinstance(pred, Predicate):
+            return None
+        self.update()
+        with self.lock:
+            candidates = self._indexedCandidates(pred)
+            if candidates is None:
+                return None
+            start = self.entries[node]
+            positioned = []
+            for entry in candidates:
+                position = self._positionBelow(entry, start, prune)
+                if position is None:
+                    continue
+                if maxDepth is not None and len(position) > maxDepth:
+                    continue
+                positioned.append((position, entry))
+        if strategy == 'bfs':
+            positioned.sort(key=lambda item: (len(item[0]), item[0]))
+        else:
+            positioned.sort(key=lambda item: item[0])
+        return [item[1] for item in positioned]
+
+    def iterDescendants(self, node, strategy='dfs', maxDepth=None, prune=None):
+        """
+        Generate the entries below the given node, like
+        Node._iterDescendants() does for the live tree.
+        """
+        self.update()
+        with self.lock:
+            start = self.entries[node]
+
+        def childrenOf(entry):
+            with self.lock:
+                return list(entry.children)
+
+        def descend(entry):
+            if prune is None:
+                return True
+            try:
+                return not prune(entry)
+            except Exception:
+                return True
+
+        if strategy == 'bfs':
+            queue = deque([(start, 0)])
+            while queue:
+                (entry, depth) = queue.popleft()
+                if maxDepth is not None and depth >= maxDepth:
+                    continue
+                for child in childrenOf(entry):
+                    yield child
+                    if descend(child):
+                        queue.append((child, depth + 1))
+        elif strategy == 'dfs':
+            stack = [iter(childrenOf(start))]
+            while stack:
+                try:
+                    child = stack[-1].next()
+                except StopIteration:
+                    stack.pop()
+                    continue
+                yield child
+                if (maxDepth is None or len(stack) < maxDepth) and \
+                        descend(child):
+                    stack.append(iter(childrenOf(child)))
+        else:
+            raise ValueError("Unknown search strategy: '%s'" % strategy)
+
+    def iterAncestors(self, node):
+        """
+        Generate the ancestors of the given node, nearest first. Once past
+        the node the mirror was built from, they come from the live tree.
+        """
+        self.update()
+        with self.lock:
+            entry = self.entries[node].parent
+        while entry is not None:
+            yield entry
+            entry = entry.parent
+        ancestor = self.root.parent
+        while ancestor is not None:
+            yield ancestor
+            ancestor = ancestor.parent
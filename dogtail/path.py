@@ -1,9 +1,25 @@
 # -*- coding: utf-8 -*-
 """
 Author: David Malcolm <dmalcolm@redhat.com>
+
+Search paths can be written as text, one step after another, each step being
+'/' (for a child) or '//' (for a descendant) followed by the type of the
+predicate and its fields, with JSON values:
+
+    /IsAnApplicationNamed(appName="gedit")//IsAButtonNamed(buttonName="Save")
+
+Fields that are None are left out, as are the parentheses of predicates with
+no fields.
 """
 __author__ = """David Malcolm <dmalcolm@redhat.com>"""
 
+import json
+import re
+
+from predicate import fromDict
+from config import config
+from logging import debugLogger as logger
+
 
 class SearchPath(object):
 
@@ -111,3 +127,312 @@ class SearchPath(object):
     def getPredicate(self, i):
         (predicate, isRecursive) = self.__list[i]
         return predicate
+
+    def toList(self):
+        """
+        Get a list describing this instance, that can be saved as JSON (see
+        fromList()).
+        """
+        return [{'predicate': pred.toDict(), 'recursive': isRecursive}
+                for (pred, isRecursive) in self.__list]
+
+    @classmethod
+    def fromList(cls, steps):
+        """
+        Recreate an instance from the list describing it.
+        """
+        result = cls()
+        for step in steps:
+            result.append(fromDict(step['predicate']),
+                          step['recursive'])
+        return result
+
+    def toText(self):
+        """
+        Get the text form of this instance (see the module docstring).
+        """
+        result = ""
+        for (pred, isRecursive) in self.__list:
+            saved = pred.toDict()
+            result += "//" if isRecursive else "/"
+            result += saved['type']
+            fields = ["%s=%s" % (field, json.dumps(saved['fields'][field]))
+                      for field in pred.fields
+                      if saved['fields'][field] is not None]
+            if fields:
+                result += "(%s)" % ", ".join(fields)
+        return result
+
+    @classmethod
+    def fromText(cls, text):
+        """
+        Parse the text form of a search path, raising ValueError if it isn't
+        valid.
+        """
+        result = cls()
+        position = skipSpace(text, 0)
+        while position < len(text):
+            match = stepPattern.match(text, position)
+            if not match:
+                raise ValueError("Invalid search path step at %d: %s" %
+                                 (position, text))
+            (separator, typeName, parenthesis) = match.groups()
+            position = match.end()
+            fields = {}
+            if parenthesis:
+                position = skipSpace(text, position)
+                while not text.startswith(')', position):
+                    match = fieldPattern.match(text, position)
+                    if not match:
+                        raise ValueError("Invalid field at %d: %s" %
+                                         (position, text))
+                    (fields[match.group(1)], position) = \
+                        jsonDecoder.raw_decode(text, match.end())
+                    position = skipSpace(text, position)
+                    if text.startswith(',', position):
+                        position = skipSpace(text, position + 1)
+                    elif not text.startswith(')', position):
+                        raise ValueError("Expected ',' or ')' at %d: %s" %
+                                         (position, text))
+                position = skipSpace(text, position + 1)
+            result.append(fromDict({'type': typeName,
+                                    'fields': fields}),
+                          separator == '//')
+        return result
+
+
+stepPattern = re.compile(r'(//?)\s*([A-Za-z_]\w*)\s*(\(?)')
+fieldPattern = re.compile(r'([A-Za-z_]\w*)\s*=\s*')
+spacePattern = re.compile(r'\s*')
+jsonDecoder = json.JSONDecoder()
+
+
+def skipSpace(text, position):
+    return spacePattern.match(text, position).end()
+
+
+class SearchPlan(object):
+
+    """
+    A SearchPath compiled for finding its node quickly:
+
+    - Runs of non-recursive steps are merged into one, that looks for the
+      whole chain of children at once, and tries the next matching child if
+      one leads nowhere rather than failing.
+
+    - Recursive steps whose predicate requires particular roles, or a label,
+      search depth-first even if config.searchStrategy is 'bfs', since only
+      depth-first searches ask the application for the nodes having those
+      roles (see config.searchUseCollection) or try the label index (see
+      config.searchUseLabelIndex). Steps looking for windows search
+      breadth-first, since windows are near the top of the tree. Other steps
+      use config.searchStrategy.
+
+    Use compilePlan() to get plans, which remembers them.
+    """
+
+    windowRoleNames = ('application', 'frame', 'dialog', 'window', 'alert',
+                       'file chooser')
+
+    def __init__(self, searchPath):
+        self.searchPath = searchPath
+        # A list of (predicates, isRecursive, strategy) triples; recursive
+        # steps have a single predicate:
+        self.steps = []
+        chain = []
+        for (pred, isRecursive) in searchPath:
+            if not isRecursive:
+                chain.append(pred)
+                continue
+            if chain:
+                self.steps.append((chain, False, None))
+                chain = []
+            self.steps.append(([pred], True, self.chooseStrategy(pred)))
+        if chain:
+            self.steps.append((chain, False, None))
+
+    def chooseStrategy(self, pred):
+        """
+        Pick the strategy for a recursive step, or None for the default.
+        """
+        roleNames = pred.requiredRoleNames or ()
+        if roleNames and \
+                all(roleName in self.windowRoleNames for roleName in roleNames):
+            return 'bfs'
+        if roleNames or pred.requiredLabel is not None:
+            return 'dfs'
+        return None
+
+    def __str__(self):
+        steps = []
+        for (predicates, isRecursive, strategy) in self.steps:
+            description = " > ".join(pred.describeSearchResult()
+                                     for pred in predicates)
+            if isRecursive:
+                description = "descendant (%s) %s" % (
+                    strategy or config.searchStrategy, description)
+            steps.append(description)
+        return "SearchPlan{%s}" % " / ".join(steps)
+
+    def resolve(self, root=None, retry=True, requireResult=True):
+        """
+        Find the node, starting from root (by default, the desktop). Raises
+        a SearchError if it isn't found, unless requireResult is False, in
+        which case it returns None.
+        """
+        if root is None:
+            from tree import root
+        node = root
+        for (predicates, isRecursive, strategy) in self.steps:
+            if isRecursive or len(predicates) == 1:
+                node = node.findChild(predicates[0], recursive=isRecursive,
+                                      retry=retry, requireResult=requireResult,
+                                      strategy=strategy)
+            else:
+                node = self.__findChain(node, predicates, retry, requireResult)
+            if node is None:
+                return None
+        return node
+
+    def __findChain(self, node, predicates, retry, requireResult):
+        from time import sleep
+        from tree import SearchError
+        from utils import Backoff
+        backoff = Backoff()
+        while True:
+            result = self.__matchChain(node, predicates)
+            if result is not None:
+                return result
+            delay = backoff.next()
+            if not retry or delay <= 0:
+                break
+            sleep(delay)
+        if requireResult:
+            raise SearchError("%s: %s" % (node.getLogString(), " > ".join(
+                pred.describeSearchResult() for pred in predicates)))
+        return None
+
+    def __matchChain(self, node, predicates):
+        """
+        Find the first node reached by a chain of children satisfying each
+        of the predicates in turn.
+        """
+        if not predicates:
+            return node
+        for child in node.iterChildren(hypertext=True):
+            try:
+                if not predicates[0].satisfiedByNode(child):
+                    continue
+            except Exception:
+                continue
+            result = self.__matchChain(child, predicates[1:])
+            if result is not None:
+                return result
+        return None
+
+
+compiledPlans = {}
+
+
+def compilePlan(searchPath):
+    """
+    Get the SearchPlan for a SearchPath, or for its text form. Plans for
+    text forms are remembered, so that they are only parsed once.
+    """
+    if not isinstance(searchPath, SearchPath):
+        try:
+            return compiledPlans[searchPath]
+        except KeyError:
+            plan = SearchPlan(SearchPath.fromText(searchPath))
+            compiledPlans[searchPath] = plan
+            return plan
+    return SearchPlan(searchPath)
+
+
+class Locator(object):
+
+    """
+    Finds a node by following a SearchPath from the root, and finds it again
+    whenever asked, e.g. by a page object that uses the same widgets over and
+    over.
+
+    The nodes found at each step of the path are remembered. When resolving
+    again, the deepest of them that is still alive and still satisfies its
+    step's predicate is reused, and only the steps below it are searched for
+    again, so a node that is still there costs a couple of calls, and one
+    whose dialog was rebuilt is only searched for within the dialog.
+
+    Locators can be saved as JSON (see toJSON() and fromJSON()).
+    """
+
+    def __init__(self, searchPath, root=None):
+        self.searchPath = searchPath
+        self.root = root
+        self.nodes = []
+
+    @classmethod
+    def forNode(cls, node):
+        """
+        Get a Locator for the given node, using its absolute search path.
+        """
+        return cls(node.getAbsoluteSearchPath())
+
+    def __str__(self):
+        return "Locator%s" % self.searchPath
+
+    def toJSON(self):
+        return json.dumps(self.searchPath.toList())
+
+    @classmethod
+    def fromJSON(cls, string, root=None):
+        return cls(SearchPath.fromList(json.loads(string)), root)
+
+    def toText(self):
+        return self.searchPath.toText()
+
+    @classmethod
+    def fromText(cls, text, root=None):
+        return cls(compilePlan(text).searchPath, root)
+
+    def __isValid(self, node, pred):
+        try:
+            return not node.dead and pred.satisfiedByNode(node)
+        except Exception:
+            return False
+
+    def resolve(self, retry=True, requireResult=True):
+        """
+        Find the node, searching again from the deepest node found last time
+        that is still valid. Raises a SearchError if it isn't found, unless
+        requireResult is False, in which case it returns None.
+        """
+        steps = list(self.searchPath)
+        # The number of steps whose nodes can be reused:
+        valid = len(self.nodes)
+        while valid > 0 and \
+                not self.__isValid(self.nodes[valid - 1], steps[valid - 1][0]):
+            valid -= 1
+        del self.nodes[valid:]
+        if config.debugSearchPaths:
+            logger.log("%s: reusing %d of %d steps" %
+                       (self, valid, len(steps)))
+        if self.nodes:
+            node = self.nodes[-1]
+        elif self.root is not None:
+            node = self.root
+        else:
+            from tree import root as node
+        for (pred, isRecursive) in steps[valid:]:
+            node = node.findChild(pred, recursive=isRecursive, retry=retry,
+                                  requireResult=requireResult)
+            if node is None:
+                return None
+            self.nodes.append(node)
+        return node
+
+    def forget(self):
+        """
+        Forget the nodes found so far, so that the next resolve() searches
+        from the root.
+        """
+        self.nodes = []
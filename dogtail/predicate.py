@@ -4,6 +4,7 @@ Author: David Malcolm <dmalcolm@redhat.com>"""
 __author__ = 'David Malcolm <dmalcolm@redhat.com>'
 
 from i18n import TranslatableString
+from __builtin__ import basestring
 
 
 def stringMatches(scriptName, reportedName):
@@ -12,6 +13,26 @@ def stringMatches(scriptName, reportedName):
     return scriptName.matchedBy(reportedName)
 
 
+# Rough costs of checking things about a node, in D-Bus round trips: reading a
+# property takes one (or none, once the search pass has it), relations and
+# components take a few, and matching patterns against a string and its
+# translations is local work, but not free. Composite predicates check the
+# cheapest parts first.
+propertyCost = 1.0
+componentCost = 2.0
+relationCost = 4.0
+patternCost = 0.5
+
+
+def stringCost(string):
+    """
+    The cost of matching a TranslatableString against a property.
+    """
+    if string.isLiteral:
+        return propertyCost
+    return propertyCost + patternCost * len(string.matchers)
+
+
 def makeScriptRecursiveArgument(isRecursive, defaultValue):
     if isRecursive == defaultValue:
         return ""
@@ -49,7 +70,38 @@ class Predicate(object):
 
     """Abstract base class representing a predicate function on nodes.
 
-    It's more than just a function in that it has data and can describe itself"""
+    It's more than just a function in that it has data and can describe itself
+
+    Subclasses that can only ever be satisfied by nodes with particular roles
+    should list those role names in requiredRoleNames (and, likewise, any
+    states the nodes must have in requiredStates). Searches can then let the
+    application do the filtering, and only evaluate the predicate on the few
+    nodes that remain.
+
+    Similarly, subclasses that can only be satisfied by nodes with a given
+    name, or labelled with a given text, should set requiredName or
+    requiredLabel to the TranslatableString in question. Exact names can
+    then be looked up in the indexes of a dogtail.mirror.TreeMirror.
+
+    The cost is a rough estimate of how expensive checking a node is (see
+    propertyCost and friends), so that And, Or and Not can check the cheapest
+    predicates first."""
+
+    requiredRoleNames = None
+    requiredStates = None
+    requiredName = None
+    requiredLabel = None
+    cost = propertyCost
+
+    # Whether satisfiedByNode can be handed the snapshots searches take of
+    # nodes (see dogtail.tree.NodeSnapshot), rather than the nodes themselves;
+    # only safe if it just reads their properties and calls their methods:
+    acceptsSnapshots = False
+
+    # The names of the constructor's arguments, which the predicate keeps as
+    # attributes of the same names, so that it can be saved and recreated
+    # (see toDict() and fromDict()); None if it can't be:
+    fields = None
 
     def satisfiedByNode(self, node):
         """Pure virtual method returning a boolean if the predicate is satisfied by the node"""
@@ -75,6 +127,43 @@ class Predicate(object):
         """
         raise NotImplementedError
 
+    def toDict(self):
+        """
+        Get a dict describing the predicate, from which fromDict() can
+        recreate it, and that can be saved as JSON.
+        """
+        if self.fields is None:
+            raise TypeError("%s predicates can't be saved" % type(self).__name__)
+        values = {}
+        for field in self.fields:
+            value = getattr(self, field)
+            if isinstance(value, TranslatableString):
+                value = value.untranslatedString
+            elif isinstance(value, Predicate):
+                value = value.toDict()
+            elif isinstance(value, tuple):
+                value = [item.toDict() if isinstance(item, Predicate) else item
+                         for item in value]
+            values[field] = value
+        return {'type': type(self).__name__, 'fields': values}
+
+    @classmethod
+    def fromFields(cls, fields):
+        """
+        Create a predicate from the values of its fields, as saved by
+        toDict().
+        """
+        return cls(**fields)
+
+    def makeScriptExpression(self):
+        """
+        Generate the Python source code that creates this predicate.
+        """
+        saved = self.toDict()
+        return "predicate.%s(%s)" % (saved['type'], ", ".join(
+            "%s=%r" % (field, saved['fields'][field]) for field in self.fields
+            if saved['fields'][field] is not None))
+
     def __eq__(self, other):
         """
         Predicates are considered equal if they are of the same subclass and
@@ -95,8 +184,14 @@ class IsAnApplicationNamed(Predicate):
 
     """Search subclass that looks for an application by name"""
 
+    requiredRoleNames = ('application',)
+    fields = ('appName',)
+    acceptsSnapshots = True
+
     def __init__(self, appName):
         self.appName = TranslatableString(appName)
+        self.requiredName = self.appName
+        self.cost = propertyCost + stringCost(self.appName)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = self._genCompareFunc()
 
@@ -120,6 +215,9 @@ class GenericPredicate(Predicate):
 
     """SubtreePredicate subclass that takes various optional search fields"""
 
+    fields = ('name', 'roleName', 'description', 'label')
+    acceptsSnapshots = True
+
     def __init__(self, name=None, roleName=None, description=None, label=None, debugName=None):
         if name:
             self.name = TranslatableString(name)
@@ -147,6 +245,21 @@ class GenericPredicate(Predicate):
                 self.debugName += " description='%s'" % description
         assert self.debugName
 
+        # The name and role are not checked at all for labelled nodes:
+        if self.label:
+            self.requiredLabel = self.label
+            self.cost = relationCost + stringCost(self.label)
+        else:
+            self.requiredName = self.name
+            if roleName:
+                self.requiredRoleNames = (roleName,)
+            self.cost = 0.0
+            for field in (self.name, roleName, description):
+                if isinstance(field, TranslatableString):
+                    self.cost += stringCost(field)
+                elif field:
+                    self.cost += propertyCost
+
         self.satisfiedByNode = self._genCompareFunc()
 
     def _genCompareFunc(self):
@@ -161,16 +274,17 @@ class GenericPredicate(Predicate):
                 else:
                     return False
             else:
-                # Ensure the node matches any criteria that were set:
-                if self.name:
-                    if not stringMatches(self.name, node.name):
-                        return False
+                # Ensure the node matches any criteria that were set, checking
+                # the cheap exact comparisons before the name patterns:
                 if self.roleName:
                     if self.roleName != node.roleName:
                         return False
                 if self.description:
                     if self.description != node.description:
                         return False
+                if self.name:
+                    if not stringMatches(self.name, node.name):
+                        return False
                 return True
         return satisfiedByNode
 
@@ -207,8 +321,13 @@ class IsNamed(Predicate):
 
     """Predicate subclass that looks simply by name"""
 
+    fields = ('name',)
+    acceptsSnapshots = True
+
     def __init__(self, name):
         self.name = TranslatableString(name)
+        self.requiredName = self.name
+        self.cost = stringCost(self.name)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = self._genCompareFunc()
 
@@ -231,8 +350,14 @@ class IsAWindowNamed(Predicate):
 
     """Predicate subclass that looks for a top-level window by name"""
 
+    requiredRoleNames = ('frame',)
+    fields = ('windowName',)
+    acceptsSnapshots = True
+
     def __init__(self, windowName):
         self.windowName = TranslatableString(windowName)
+        self.requiredName = self.windowName
+        self.cost = propertyCost + stringCost(self.windowName)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = self._genCompareFunc()
 
@@ -255,6 +380,10 @@ class IsAWindow(Predicate):
 
     """Predicate subclass that looks for top-level windows"""
 
+    requiredRoleNames = ('frame',)
+    fields = ()
+    acceptsSnapshots = True
+
     def __init__(self):
         self.satisfiedByNode = lambda node: node.roleName == 'frame'
 
@@ -266,8 +395,14 @@ class IsADialogNamed(Predicate):
 
     """Predicate subclass that looks for a top-level dialog by name"""
 
+    requiredRoleNames = ('dialog',)
+    fields = ('dialogName',)
+    acceptsSnapshots = True
+
     def __init__(self, dialogName):
         self.dialogName = TranslatableString(dialogName)
+        self.requiredName = self.dialogName
+        self.cost = propertyCost + stringCost(self.dialogName)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = self._genCompareFunc()
 
@@ -296,8 +431,13 @@ class IsLabelledAs(Predicate):
 
     """Predicate: is this node labelled with the text string (i.e. by another node with that as a name)"""
 
+    fields = ('labelText',)
+    acceptsSnapshots = True
+
     def __init__(self, labelText):
         self.labelText = TranslatableString(labelText)
+        self.requiredLabel = self.labelText
+        self.cost = relationCost + stringCost(self.labelText)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = self._genCompareFunc()
 
@@ -324,8 +464,14 @@ class IsAMenuNamed(Predicate):
 
     """Predicate subclass that looks for a menu by name"""
 
+    requiredRoleNames = ('menu',)
+    fields = ('menuName',)
+    acceptsSnapshots = True
+
     def __init__(self, menuName):
         self.menuName = TranslatableString(menuName)
+        self.requiredName = self.menuName
+        self.cost = propertyCost + stringCost(self.menuName)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = lambda node: node.roleName == 'menu' and \
             stringMatches(self.menuName, node.name)
@@ -344,8 +490,15 @@ class IsAMenuItemNamed(Predicate):
 
     """Predicate subclass that looks for a menu item by name"""
 
+    requiredRoleNames = ('menu item', 'check menu item',
+                         'radio menu item', 'tearoff menu item')
+    fields = ('menuItemName',)
+    acceptsSnapshots = True
+
     def __init__(self, menuItemName):
         self.menuItemName = TranslatableString(menuItemName)
+        self.requiredName = self.menuItemName
+        self.cost = propertyCost + stringCost(self.menuItemName)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = lambda node: \
             node.roleName.endswith('menu item') and \
@@ -365,8 +518,14 @@ class IsATextEntryNamed(Predicate):
 
     """Predicate subclass that looks for a text entry by name"""
 
+    requiredRoleNames = ('text',)
+    fields = ('textEntryName',)
+    acceptsSnapshots = True
+
     def __init__(self, textEntryName):
         self.textEntryName = TranslatableString(textEntryName)
+        self.requiredName = self.textEntryName
+        self.cost = propertyCost + stringCost(self.textEntryName)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = lambda node: node.roleName == 'text' and \
             stringMatches(self.textEntryName, node.name)
@@ -385,8 +544,14 @@ class IsAButtonNamed(Predicate):
 
     """Predicate subclass that looks for a button by name"""
 
+    requiredRoleNames = ('push button',)
+    fields = ('buttonName',)
+    acceptsSnapshots = True
+
     def __init__(self, buttonName):
         self.buttonName = TranslatableString(buttonName)
+        self.requiredName = self.buttonName
+        self.cost = propertyCost + stringCost(self.buttonName)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = lambda node: node.roleName == 'push button' \
             and stringMatches(self.buttonName, node.name)
@@ -405,8 +570,14 @@ class IsATabNamed(Predicate):
 
     """Predicate subclass that looks for a tab by name"""
 
+    requiredRoleNames = ('page tab',)
+    fields = ('tabName',)
+    acceptsSnapshots = True
+
     def __init__(self, tabName):
         self.tabName = TranslatableString(tabName)
+        self.requiredName = self.tabName
+        self.cost = propertyCost + stringCost(self.tabName)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = lambda node: node.roleName == 'page tab' and \
             stringMatches(self.tabName, node.name)
@@ -419,3 +590,355 @@ class IsATabNamed(Predicate):
 
     def makeScriptVariableName(self):
         return makeCamel(self.tabName) + "Tab"
+
+
+class IsNotShowing(Predicate):
+
+    """Predicate subclass matching nodes that are not showing on the screen,
+    such as the pages of tabs that are not selected, and the rows of collapsed
+    tree nodes. Mostly useful for pruning searches."""
+
+    fields = ()
+    acceptsSnapshots = True
+
+    def __init__(self):
+        self.satisfiedByNode = lambda node: not node.showing
+
+    def describeSearchResult(self):
+        return 'not showing'
+
+
+class IsATable(Predicate):
+
+    """Predicate subclass matching tables and tree tables. Mostly useful for
+    pruning searches, since tables can have very many cells."""
+
+    requiredRoleNames = ('table', 'tree table')
+    fields = ()
+    acceptsSnapshots = True
+
+    def __init__(self):
+        self.satisfiedByNode = lambda node: node.roleName in self.requiredRoleNames
+
+    def describeSearchResult(self):
+        return 'table'
+
+
+class IsAnInactiveWindow(Predicate):
+
+    """Predicate subclass matching the top-level windows of an application
+    other than the active one. Mostly useful for pruning searches started
+    from an application."""
+
+    windowRoleNames = ('frame', 'dialog', 'window', 'alert', 'file chooser')
+    fields = ()
+    acceptsSnapshots = True
+    cost = 3 * propertyCost
+
+    def __init__(self):
+        from pyatspi import STATE_ACTIVE
+
+        def satisfiedByNode(node):
+            return node.roleName in self.windowRoleNames and \
+                node.parent.roleName == 'application' and \
+                not node.getState().contains(STATE_ACTIVE)
+        self.satisfiedByNode = satisfiedByNode
+
+    def describeSearchResult(self):
+        return 'inactive window'
+
+
+class HasRole(Predicate):
+
+    """Predicate subclass matching nodes with any of the given roles (a role
+    name, or a list of them)"""
+
+    fields = ('roleNames',)
+    acceptsSnapshots = True
+
+    def __init__(self, roleNames):
+        if isinstance(roleNames, basestring):
+            roleNames = (roleNames,)
+        self.roleNames = tuple(roleNames)
+        self.requiredRoleNames = self.roleNames
+        self.satisfiedByNode = lambda node: node.roleName in self.roleNames
+
+    def describeSearchResult(self):
+        return "with role %s" % " or ".join("'%s'" % roleName
+                                            for roleName in self.roleNames)
+
+    def makeScriptMethodCall(self, isRecursive):
+        if len(self.roleNames) == 1:
+            return "child(roleName='%s'%s)" % (
+                self.roleNames[0], makeScriptRecursiveArgument(isRecursive, True))
+        return "findChild(%s%s)" % (self.makeScriptExpression(),
+                                    makeScriptRecursiveArgument(isRecursive, True))
+
+    def makeScriptVariableName(self):
+        return makeCamel(self.roleNames[0]) + "Node"
+
+
+class HasState(Predicate):
+
+    """Predicate subclass matching nodes in the given state, named as in
+    pyatspi but without the STATE_ prefix, e.g. 'focused' or 'checked'"""
+
+    fields = ('stateName',)
+    acceptsSnapshots = True
+
+    def __init__(self, stateName):
+        import pyatspi
+        self.stateName = stateName
+        try:
+            self.state = getattr(pyatspi, 'STATE_' +
+                                 stateName.upper().replace(' ', '_'))
+        except AttributeError:
+            raise ValueError("Unknown state: %s" % stateName)
+        self.requiredStates = (self.state,)
+        self.satisfiedByNode = lambda node: \
+            node.getState().contains(self.state)
+
+    def describeSearchResult(self):
+        return "%s" % self.stateName
+
+    def makeScriptMethodCall(self, isRecursive):
+        return "findChild(%s%s)" % (self.makeScriptExpression(),
+                                    makeScriptRecursiveArgument(isRecursive, True))
+
+    def makeScriptVariableName(self):
+        return makeCamel(self.stateName) + "Node"
+
+
+class HasDescription(Predicate):
+
+    """Predicate subclass matching nodes with exactly the given description"""
+
+    fields = ('description',)
+    acceptsSnapshots = True
+
+    def __init__(self, description):
+        self.description = description
+        self.satisfiedByNode = lambda node: \
+            node.description == self.description
+
+    def describeSearchResult(self):
+        return "described as '%s'" % self.description
+
+    def makeScriptMethodCall(self, isRecursive):
+        return "child(description='%s'%s)" % (
+            self.description, makeScriptRecursiveArgument(isRecursive, True))
+
+    def makeScriptVariableName(self):
+        return makeCamel(self.description) + "Node"
+
+
+class HasAttribute(Predicate):
+
+    """Predicate subclass matching nodes having the given (toolkit-specific)
+    attribute, with the given value unless that is None"""
+
+    fields = ('attributeName', 'value')
+    acceptsSnapshots = True
+
+    def __init__(self, attributeName, value=None):
+        self.attributeName = attributeName
+        self.value = value
+
+        def satisfiedByNode(node):
+            for attribute in node.getAttributes():
+                (name, separator, value) = attribute.partition(':')
+                if name == self.attributeName:
+                    return self.value is None or value == self.value
+            return False
+        self.satisfiedByNode = satisfiedByNode
+
+    def describeSearchResult(self):
+        if self.value is None:
+            return "with attribute '%s'" % self.attributeName
+        return "with attribute %s='%s'" % (self.attributeName, self.value)
+
+    def makeScriptMethodCall(self, isRecursive):
+        return "findChild(%s%s)" % (self.makeScriptExpression(),
+                                    makeScriptRecursiveArgument(isRecursive, True))
+
+    def makeScriptVariableName(self):
+        return makeCamel(self.attributeName) + "Node"
+
+
+class ContainsPoint(Predicate):
+
+    """Predicate subclass matching nodes whose extents contain the given
+    point, in desktop coordinates"""
+
+    fields = ('x', 'y')
+    acceptsSnapshots = True
+    cost = componentCost
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.satisfiedByNode = lambda node: node.contains(self.x, self.y)
+
+    def describeSearchResult(self):
+        return "containing (%s, %s)" % (self.x, self.y)
+
+    def makeScriptMethodCall(self, isRecursive):
+        return "findChild(%s%s)" % (self.makeScriptExpression(),
+                                    makeScriptRecursiveArgument(isRecursive, True))
+
+    def makeScriptVariableName(self):
+        return "node"
+
+
+class CompositePredicate(Predicate):
+
+    """Abstract base class of predicates combining others, which checks
+    the cheapest of them first"""
+
+    operator = None
+
+    def __init__(self, *predicates):
+        assert predicates
+        for pred in predicates:
+            assert isinstance(pred, Predicate)
+        self.predicates = tuple(predicates)
+        self.cost = sum(pred.cost for pred in self.predicates)
+        self.acceptsSnapshots = all(pred.acceptsSnapshots
+                                    for pred in self.predicates)
+        self.ordered = sorted(self.predicates, key=lambda pred: pred.cost)
+
+    @classmethod
+    def fromFields(cls, fields):
+        return cls(*[fromDict(saved) for saved in fields['predicates']])
+
+    def describeSearchResult(self):
+        return "(%s)" % (" %s " % self.operator).join(
+            pred.describeSearchResult() for pred in self.predicates)
+
+    def makeScriptExpression(self):
+        return "predicate.%s(%s)" % (type(self).__name__, ", ".join(
+            pred.makeScriptExpression() for pred in self.predicates))
+
+    def makeScriptMethodCall(self, isRecursive):
+        return "findChild(%s%s)" % (self.makeScriptExpression(),
+                                    makeScriptRecursiveArgument(isRecursive, True))
+
+    def makeScriptVariableName(self):
+        for pred in self.predicates:
+            try:
+                return pred.makeScriptVariableName()
+            except NotImplementedError:
+                continue
+        return "node"
+
+
+class And(CompositePredicate):
+
+    """Predicate subclass matching nodes that satisfy all of the given
+    predicates"""
+
+    fields = ('predicates',)
+    operator = 'and'
+
+    def __init__(self, *predicates):
+        CompositePredicate.__init__(self, *predicates)
+        # A node has to satisfy all of the requirements of all of them:
+        for pred in self.predicates:
+            if pred.requiredRoleNames:
+                if self.requiredRoleNames is None:
+                    self.requiredRoleNames = pred.requiredRoleNames
+                else:
+                    self.requiredRoleNames = tuple(
+                        roleName for roleName in self.requiredRoleNames
+                        if roleName in pred.requiredRoleNames)
+            if pred.requiredStates:
+                self.requiredStates = (self.requiredStates or ()) + \
+                    tuple(pred.requiredStates)
+            if self.requiredName is None:
+                self.requiredName = pred.requiredName
+            if self.requiredLabel is None:
+                self.requiredLabel = pred.requiredLabel
+
+        def satisfiedByNode(node):
+            for pred in self.ordered:
+                if not pred.satisfiedByNode(node):
+                    return False
+            return True
+        self.satisfiedByNode = satisfiedByNode
+
+
+class Or(CompositePredicate):
+
+    """Predicate subclass matching nodes that satisfy any of the given
+    predicates"""
+
+    fields = ('predicates',)
+    operator = 'or'
+
+    def __init__(self, *predicates):
+        CompositePredicate.__init__(self, *predicates)
+        # Roles can only be required if each of them requires some:
+        if all(pred.requiredRoleNames for pred in self.predicates):
+            roleNames = []
+            for pred in self.predicates:
+                roleNames.extend(roleName for roleName in pred.requiredRoleNames
+                                 if roleName not in roleNames)
+            self.requiredRoleNames = tuple(roleNames)
+
+        def satisfiedByNode(node):
+            for pred in self.ordered:
+                if pred.satisfiedByNode(node):
+                    return True
+            return False
+        self.satisfiedByNode = satisfiedByNode
+
+
+class Not(Predicate):
+
+    """Predicate subclass matching nodes that don't satisfy the given
+    predicate"""
+
+    fields = ('predicate',)
+
+    def __init__(self, predicate):
+        assert isinstance(predicate, Predicate)
+        self.predicate = predicate
+        self.cost = predicate.cost
+        self.acceptsSnapshots = predicate.acceptsSnapshots
+        self.satisfiedByNode = lambda node: \
+            not self.predicate.satisfiedByNode(node)
+
+    @classmethod
+    def fromFields(cls, fields):
+        return cls(fromDict(fields['predicate']))
+
+    def describeSearchResult(self):
+        return "not %s" % self.predicate.describeSearchResult()
+
+    def makeScriptExpression(self):
+        return "predicate.Not(%s)" % self.predicate.makeScriptExpression()
+
+    def makeScriptMethodCall(self, isRecursive):
+        return "findChild(%s%s)" % (self.makeScriptExpression(),
+                                    makeScriptRecursiveArgument(isRecursive, True))
+
+    def makeScriptVariableName(self):
+        return "node"
+
+
+def fromDict(data):
+    """
+    Recreate a predicate from the dict describing it (see
+    Predicate.toDict()).
+    """
+    cls = globals().get(data['type'])
+    if not isinstance(cls, type) or not issubclass(cls, Predicate) or \
+            cls.fields is None:
+        raise ValueError("Unknown predicate type: %s" % data['type'])
+    fields = data.get('fields', {})
+    for field in fields:
+        if field not in cls.fields:
+            raise ValueError("%s predicates have no field %s" %
+                             (data['type'], field))
+    return cls.fromFields(dict((str(field), fields.get(field))
+                               for field in cls.fields))
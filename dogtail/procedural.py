@@ -112,8 +112,8 @@ class FocusWindow (FocusBase):
         result = None
         pred = predicate.IsAWindowNamed(name)
         try:
-            result = FocusApplication.node.findChild(
-                pred, requireResult=False, recursive=False)
+            result = FocusApplication.node.waitForWindow(
+                pred, requireResult=False)
         except AttributeError:
             pass
         if result:
@@ -142,8 +142,8 @@ class FocusDialog (FocusBase):
         result = None
         pred = predicate.IsADialogNamed(name)
         try:
-            result = FocusApplication.node.findChild(
-                pred, requireResult=False, recursive=False)
+            result = FocusApplication.node.waitForDialog(
+                pred, requireResult=False)
         except AttributeError:
             pass
         if result:
@@ -19,6 +19,7 @@ gi.require_version('Gdk', '3.0')
 from gi.repository import Gdk
 from config import config
 from utils import doDelay
+from events import settling
 from logging import debugLogger as logger
 from pyatspi import Registry as registry
 from pyatspi import (KEY_SYM, KEY_PRESS, KEY_PRESSRELEASE, KEY_RELEASE)
@@ -43,8 +44,8 @@ def click(x, y, button=1, check=True):
     if check:
         checkCoordinates(x, y)
     logger.log("Mouse button %s click at (%s,%s)" % (button, x, y))
-    registry.generateMouseEvent(x, y, 'b%sc' % button)
-    doDelay(config.actionDelay)
+    with settling(delay=config.actionDelay):
+        registry.generateMouseEvent(x, y, 'b%sc' % button)
 
 
 def doubleClick(x, y, button=1, check=True):
@@ -54,8 +55,8 @@ def doubleClick(x, y, button=1, check=True):
     if check:
         checkCoordinates(x, y)
     logger.log("Mouse button %s doubleclick at (%s,%s)" % (button, x, y))
-    registry.generateMouseEvent(x, y, 'b%sd' % button)
-    doDelay()
+    with settling(delay=config.defaultDelay):
+        registry.generateMouseEvent(x, y, 'b%sd' % button)
 
 
 def press(x, y, button=1, check=True):
@@ -65,8 +66,8 @@ def press(x, y, button=1, check=True):
     if check:
         checkCoordinates(x, y)
     logger.log("Mouse button %s press at (%s,%s)" % (button, x, y))
-    registry.generateMouseEvent(x, y, 'b%sp' % button)
-    doDelay()
+    with settling(delay=config.defaultDelay):
+        registry.generateMouseEvent(x, y, 'b%sp' % button)
 
 
 def release(x, y, button=1, check=True):
@@ -76,8 +77,8 @@ def release(x, y, button=1, check=True):
     if check:
         checkCoordinates(x, y)
     logger.log("Mouse button %s release at (%s,%s)" % (button, x, y))
-    registry.generateMouseEvent(x, y, 'b%sr' % button)
-    doDelay()
+    with settling(delay=config.defaultDelay):
+        registry.generateMouseEvent(x, y, 'b%sr' % button)
 
 
 def absoluteMotion(x, y, mouseDelay=None, check=True):
@@ -121,17 +122,26 @@ def drag(fromXY, toXY, button=1, check=True):
     doDelay()
 
 
-def typeText(string):
+def typeText(string, batchSize=None):
     """
     Types the specified string, one character at a time.
     Please note, you may have to set a higher typing delay,
     if your machine misses/switches the characters typed.
     Needed sometimes on slow setups/VMs typing non-ASCII utf8 chars.
+
+    The typing delay is only inserted after every batchSize characters
+    (config.typingBatchSize by default, normally 1), so larger batches are
+    typed correspondingly faster. A batchSize below 1 counts as 1.
     """
+    if batchSize is None:
+        batchSize = config.typingBatchSize
+    batchSize = max(batchSize, 1)
     if not isinstance(string, unicode):
         string = string.decode('utf-8')
-    for char in string:
-        pressKey(char)
+    for (index, char) in enumerate(string):
+        generateKey(char)
+        if (index + 1) % batchSize == 0 or index == len(string) - 1:
+            doTypingDelay()
 
 keyNameAliases = {
     'enter': 'Return',
@@ -174,7 +184,21 @@ def keySymToKeyName(keySym):  # pragma: no cover
     return Gdk.keyval_name(keySym)
 
 
+# Key names (and characters) looked up so far, and their keysyms. These don't
+# depend on the keyboard layout.
+keySyms = {}
+
+
 def keyNameToKeySym(keyName):
+    try:
+        return keySyms[keyName]
+    except KeyError:
+        pass
+    keySyms[keyName] = keySym = lookUpKeySym(keyName)
+    return keySym
+
+
+def lookUpKeySym(keyName):
     keyName = keyNameAliases.get(keyName.lower(), keyName)
     keySym = Gdk.keyval_from_name(keyName)
     # various error 'codes' returned for non-recognized chars in versions of GTK3.X
@@ -199,13 +223,65 @@ def keyNameToKeyCode(keyName):
     Generally you should use uniCharToKeySym() and should only need this
     function for nonprintable keys anyway.
     """
-    keymap = Gdk.Keymap.get_for_display(Gdk.Display.get_default())
-    entries = keymap.get_entries_for_keyval(
-        Gdk.keyval_from_name(keyName))
+    return getKeymapCache().keyCode(keyName)
+
+
+class KeymapCache(object):
+
+    """
+    The keycodes of key names in the keymap of a display, as they are looked
+    up. They are forgotten whenever the keymap changes.
+    """
+
+    def __init__(self, display):
+        self.keymap = Gdk.Keymap.get_for_display(display)
+        self.keyCodes = {}
+        self.keymap.connect('keys-changed', self.invalidate)
+
+    def invalidate(self, keymap=None):
+        self.keyCodes.clear()
+
+    def keyCode(self, keyName):
+        try:
+            return self.keyCodes[keyName]
+        except KeyError:
+            pass
+        entries = self.keymap.get_entries_for_keyval(
+            Gdk.keyval_from_name(keyName))
+        try:
+            keyCode = entries[1][0].keycode
+        except TypeError:
+            keyCode = None
+        self.keyCodes[keyName] = keyCode
+        return keyCode
+
+
+keymapCaches = {}
+
+
+def getKeymapCache():
+    """
+    Get the KeymapCache of the default display.
+    """
+    display = Gdk.Display.get_default()
+    name = display.get_name()
+    if name not in keymapCaches:
+        keymapCaches[name] = KeymapCache(display)
+    return keymapCaches[name]
+
+
+# Whether the names used in key combos so far are known to Gdk:
+knownKeyNames = {}
+
+
+def isKnownKeyName(keyName):
     try:
-        return entries[1][0].keycode
-    except TypeError:
+        return knownKeyNames[keyName]
+    except KeyError:
         pass
+    known = hasattr(Gdk, keyName) or hasattr(Gdk, 'KEY_' + keyName)
+    knownKeyNames[keyName] = known
+    return known
 
 
 def pressKey(keyName):
@@ -215,9 +291,16 @@ def pressKey(keyName):
     Names are looked up in Gdk.KEY_ If they are not found there, they are
     looked up by uniCharToKeySym().
     """
+    generateKey(keyName)
+    doTypingDelay()
+
+
+def generateKey(keyName):
+    """
+    Presses (and releases) the key specified by keyName, without any delay.
+    """
     keySym = keyNameToKeySym(keyName)
     registry.generateKeyboardEvent(keySym, None, KEY_SYM)
-    doTypingDelay()
 
 
 def keyCombo(comboString):
@@ -236,9 +319,8 @@ def keyCombo(comboString):
                     S = keyNameAliases.get(S.lower(), S)
                     strings.append(S)
     for s in strings:
-        if not hasattr(Gdk, s):
-            if not hasattr(Gdk, 'KEY_' + s):
-                raise ValueError("Cannot find key %s" % s)
+        if not isKnownKeyName(s):
+            raise ValueError("Cannot find key %s" % s)
     modifiers = strings[:-1]
     finalKey = strings[-1]
     for modifier in modifiers:
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+Search statistics
+
+Collects, for every search made while it is active, how long it took, how
+much of that was spent sleeping between retries, how many nodes were checked
+against the predicate, and how many calls of each kind were made to the
+accessibility API (each of which is a D-Bus round trip, unless cached):
+
+    from dogtail import stats
+    with stats.Stats('preferences test') as searchStats:
+        ...
+    searchStats.log()
+
+The summary lists the searches that took longest, together with where in the
+calling script they were made. If config.debugSearchStats is True, every
+search is also logged as it finishes.
+
+Calls are counted by wrapping the relevant attributes of
+Accessibility.Accessible while any Stats is active, so there is no cost when
+none is. Searches running concurrently (in threads or in dogtail.aio) have
+their calls attributed to the most recently started one.
+"""
+import os
+import threading
+import traceback
+from time import time
+
+from config import config
+from logging import debugLogger as logger
+
+# The attributes whose use is counted, and the names of the calls they make
+# (where they are aliases or properties):
+countedAttributes = {
+    'name': 'getName',
+    'description': 'getDescription',
+    'parent': 'getParent',
+    'childCount': 'getChildCount',
+    'role': 'getRole',
+    'roleName': 'getRoleName',
+    'indexInParent': 'getIndexInParent',
+    'getChildAtIndex': 'getChildAtIndex',
+    'getIndexInParent': 'getIndexInParent',
+    'getRelationSet': 'getRelationSet',
+    'getRole': 'getRole',
+    'getRoleName': 'getRoleName',
+    'getLocalizedRoleName': 'getLocalizedRoleName',
+    'getState': 'getState',
+    'getApplication': 'getApplication',
+    'getAttributes': 'getAttributes',
+    'queryAction': 'queryAction',
+    'queryCollection': 'queryCollection',
+    'queryComponent': 'queryComponent',
+    'queryEditableText': 'queryEditableText',
+    'queryHypertext': 'queryHypertext',
+    'queryTable': 'queryTable',
+    'queryText': 'queryText',
+    'queryValue': 'queryValue',
+}
+
+activeStats = []
+activeStatsLock = threading.RLock()
+currentSearches = []
+originalAttributes = {}
+callDepth = threading.local()
+
+packageDirectory = os.path.dirname(os.path.abspath(__file__))
+
+
+class SearchRecord(object):
+
+    """
+    The statistics of a single search.
+    """
+
+    def __init__(self, description, caller):
+        self.description = description
+        self.caller = caller
+        self.startTime = time()
+        self.duration = None
+        self.found = None
+        self.nodesVisited = 0
+        self.retries = 0
+        self.sleepTime = 0.0
+        self.calls = {}
+
+    @property
+    def traversalTime(self):
+        """
+        The time spent searching, rather than sleeping between attempts.
+        """
+        return (self.duration or 0.0) - self.sleepTime
+
+    @property
+    def callCount(self):
+        return sum(self.calls.values())
+
+    def __str__(self):
+        return "%s: %s: %.3fs (%.3fs traversing), %d nodes visited, " \
+            "%d calls, %d retries%s" % (
+                self.caller, self.description, self.duration or 0.0,
+                self.traversalTime, self.nodesVisited, self.callCount,
+                self.retries, "" if self.found else ", not found")
+
+
+class Stats(object):
+
+    """
+    Collects statistics on the searches made while it is active. Use it as a
+    context manager, or call start() and stop().
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.searches = []
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        with activeStatsLock:
+            if self in activeStats:
+                return
+            if not activeStats:
+                installCounters()
+            activeStats.append(self)
+
+    def stop(self):
+        with activeStatsLock:
+            if self not in activeStats:
+                return
+            activeStats.remove(self)
+            if not activeStats:
+                removeCounters()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+        return False
+
+    def reset(self):
+        with self.lock:
+            self.searches = []
+            self.calls = {}
+
+    @property
+    def totalTime(self):
+        return sum(record.duration or 0.0 for record in self.searches)
+
+    @property
+    def sleepTime(self):
+        return sum(record.sleepTime for record in self.searches)
+
+    @property
+    def nodesVisited(self):
+        return sum(record.nodesVisited for record in self.searches)
+
+    @property
+    def retries(self):
+        return sum(record.retries for record in self.searches)
+
+    def summary(self, limit=10):
+        """
+        Describe the statistics collected so far, listing the limit searches
+        that took the longest.
+        """
+        with self.lock:
+            searches = [record for record in self.searches
+                        if record.duration is not None]
+            calls = sorted(self.calls.items(), key=lambda item: -item[1])
+        totalTime = sum(record.duration for record in searches)
+        sleepTime = sum(record.sleepTime for record in searches)
+        lines = ["Search statistics%s: %d searches in %.3fs (%.3fs traversing, "
+                 "%.3fs sleeping), %d nodes visited, %d retries" % (
+                     " for %s" % self.name if self.name else "",
+                     len(searches), totalTime, totalTime - sleepTime, sleepTime,
+                     sum(record.nodesVisited for record in searches),
+                     sum(record.retries for record in searches))]
+        if calls:
+            lines.append("Calls: " + ", ".join("%s %d" % call for call in calls))
+        slowest = sorted(searches, key=lambda record: -record.duration)[:limit]
+        if slowest:
+            lines.append("Slowest searches:")
+        for record in slowest:
+            share = 100.0 * record.duration / totalTime if totalTime else 0.0
+            lines.append("  %5.1f%% %s" % (share, record))
+        return "\n".join(lines)
+
+    def log(self, limit=10):
+        """
+        Write the summary to the debug log.
+        """
+        for line in self.summary(limit).split("\n"):
+            logger.log(line)
+
+    def _started(self, record):
+        with self.lock:
+            self.searches.append(record)
+
+    def _called(self, callName):
+        with self.lock:
+            self.calls[callName] = self.calls.get(callName, 0) + 1
+
+
+def findCaller():
+    """
+    Get 'file:line' for the innermost stack frame outside of dogtail.
+    """
+    for (filename, line, function, text) in reversed(traceback.extract_stack()):
+        if not os.path.abspath(filename).startswith(packageDirectory):
+            return "%s:%d" % (filename, line)
+    return "?"
+
+
+def countCall(callName, function):
+    """
+    Wrap function, counting calls to it as callName. Calls it makes in turn
+    are not counted.
+    """
+    def counted(*args, **kwargs):
+        depth = getattr(callDepth, 'depth', 0)
+        if depth == 0:
+            for stats in list(activeStats):
+                stats._called(callName)
+            with activeStatsLock:
+                if currentSearches:
+                    calls = currentSearches[-1].calls
+                    calls[callName] = calls.get(callName, 0) + 1
+        callDepth.depth = depth + 1
+        try:
+            return function(*args, **kwargs)
+        finally:
+            callDepth.depth = depth
+    return counted
+
+
+def installCounters():
+    """
+    Wrap the counted attributes of Accessibility.Accessible (including those
+    that dogtail.tree mixes into it).
+    """
+    import Accessibility
+    for cls in Accessibility.Accessible.__mro__:
+        for (attribute, callName) in countedAttributes.items():
+            if attribute not in cls.__dict__:
+                continue
+            original = cls.__dict__[attribute]
+            if isinstance(original, property):
+                wrapped = property(countCall(callName, original.fget),
+                                   original.fset, original.fdel, original.__doc__)
+            elif callable(original):
+                wrapped = countCall(callName, original)
+            else:
+                continue
+            try:
+                setattr(cls, attribute, wrapped)
+            except (TypeError, AttributeError):
+                continue
+            originalAttributes[(cls, attribute)] = original
+
+
+def removeCounters():
+    for ((cls, attribute), original) in originalAttributes.items():
+        setattr(cls, attribute, original)
+    originalAttributes.clear()
+
+
+def searchStarted(describe):
+    """
+    Called by dogtail.tree when a search starts, with a function describing
+    the search; returns the record of it (or None if no statistics are being
+    collected).
+    """
+    if not activeStats:
+        return None
+    # Describing the search isn't part of it:
+    depth = getattr(callDepth, 'depth', 0)
+    callDepth.depth = depth + 1
+    try:
+        description = describe()
+    finally:
+        callDepth.depth = depth
+    record = SearchRecord(description, findCaller())
+    for stats in list(activeStats):
+        stats._started(record)
+    with activeStatsLock:
+        currentSearches.append(record)
+    return record
+
+
+def searchFinished(record, found):
+    if record is None:
+        return
+    record.duration = time() - record.startTime
+    record.found = found
+    with activeStatsLock:
+        if record in currentSearches:
+            currentSearches.remove(record)
+    if config.debugSearchStats:
+        logger.log(str(record))
+
+
+def searchRetried(record, sleepTime):
+    """
+    Record that the search failed and waited sleepTime seconds before being
+    retried.
+    """
+    if record is None:
+        return
+    record.retries += 1
+    record.sleepTime += sleepTime
+
+
+def countVisits(pred):
+    """
+    Wrap the predicate function so that the nodes it is checked against are
+    counted, if statistics are being collected.
+    """
+    if not activeStats:
+        return pred
+
+    def counted(node):
+        with activeStatsLock:
+            if currentSearches:
+                currentSearches[-1].nodesVisited += 1
+        return pred(node)
+    return counted
@@ -28,13 +28,22 @@ nodes) satisfying whatever criteria you are interested in. It does this with
 a 'backoff and retry' algorithm. This fixes most timing problems e.g. when a
 dialog is in the process of opening but hasn't yet done so.
 
-If a search fails, it waits 'config.searchBackoffDuration' seconds, and then
-tries again, repeatedly. After several failed attempts (determined by
-config.searchWarningThreshold) it will start sending warnings about the search
-to the debug log. If it still can't succeed after 'config.searchCutoffCount'
-attempts, it raises an exception containing details of the search. You can see
+If a search fails, it waits a little, and then tries again, repeatedly. The
+waits start at 'config.searchBackoffInitial' seconds and grow exponentially up
+to 'config.searchBackoffDuration', so that a search for something that is
+about to appear succeeds quickly, without hammering a slow application. Once
+it has been failing for a while (config.searchWarningThreshold times
+'config.searchBackoffDuration' seconds) it will start sending warnings about
+the search to the debug log. If it still can't
+succeed after 'config.searchTimeout' seconds (or the timeout passed to the
+search), it raises an exception containing details of the search. You can see
 all of this process in the debug log by setting 'config.debugSearching' to True
 
+If 'config.searchWaitForEvents' is True, a failed search does not simply sleep:
+it listens for AT-SPI events (children being added or removed, names changing,
+windows being created) from the application being searched, and retries as soon
+as one arrives. The backoff delays then only act as an upper bound.
+
 We also automatically add a short delay after each action
 ('config.defaultDelay' gives the time in seconds). We'd hoped that the search
 backoff and retry code would eliminate the need for this, but unfortunately we
@@ -49,6 +58,9 @@ The classes trap various UI malfunctions and raise exceptions that better
 describe what went wrong. For example, they detects attempts to click on an
 insensitive UI element and raise a specific exception for this.
 
+Searches below an application can also be answered from memory, by running a
+dogtail.mirror.TreeMirror of it; see that module for details.
+
 Unfortunately, some applications do not set up the 'sensitive' state
 correctly on their buttons (e.g. Epiphany on form buttons in a web page). The
 current workaround for this is to set config.ensureSensitivity=False, which
@@ -66,13 +78,23 @@ if config.checkForA11y:
     checkForA11y()
 
 import predicate
-from time import sleep
+from time import sleep, time
+from collections import deque, OrderedDict
+import sys
+from multiprocessing.pool import ThreadPool
+import threading
 from utils import doDelay
 from utils import Blinker
 from utils import Lock
+from utils import Backoff
 import rawinput
 import path
-from __builtin__ import xrange
+from events import EventWaiter, deathEventTypes, livenessCache, settling
+from events import pumpEvents
+import mirror
+import stats
+from i18n import safeDecode
+from __builtin__ import xrange, unicode
 
 from logging import debugLogger as logger
 
@@ -97,6 +119,121 @@ from gi.repository import GLib
 haveWarnedAboutChildrenLimit = False
 
 
+def nodeFunction(pred):
+    """
+    Turn a predicate (or a function on nodes) into the function that searches
+    check nodes with, which is handed the NodeSnapshot (or, when searching a
+    mirror, the MirrorEntry) of each node. Only the predicates that say they
+    accept snapshots are handed them as they are; other predicates and
+    functions get the Node itself, so that they can use all of its methods,
+    and check that it is one.
+    """
+    if isinstance(pred, predicate.Predicate):
+        if pred.acceptsSnapshots:
+            return pred.satisfiedByNode
+        function = pred.satisfiedByNode
+    else:
+        function = pred
+
+    def satisfiedByNode(node):
+        if isinstance(node, (NodeSnapshot, mirror.MirrorEntry)):
+            node = node.node
+        return function(node)
+    return satisfiedByNode
+
+
+def makePruner(prune):
+    """
+    Turn the prune argument of the search methods (None, a predicate, or a
+    list of predicates) into a function on nodes, or None.
+    """
+    if prune is None:
+        return None
+    if isinstance(prune, (list, tuple)):
+        pruners = [makePruner(pruner) for pruner in prune]
+
+        def pruneAny(node):
+            for pruner in pruners:
+                if pruner(node):
+                    return True
+            return False
+        return pruneAny
+    return nodeFunction(prune)
+
+
+def isAlive(node):
+    """
+    Check whether the node is alive, reading just its states: the states of
+    dead nodes either can't be read, or include 'defunct'. Some toolkits
+    instead leave dead nodes without any states, and only give them the
+    'invalid' role, so the role is only read for nodes without states.
+    """
+    try:
+        states = node.getState()
+        if states.contains(pyatspi.STATE_DEFUNCT):
+            return False
+        if states.getStates():
+            return True
+        return node.roleName != 'invalid'
+    except Exception:
+        return False
+
+
+# The events after which labels may be named or placed differently:
+labelEventTypes = ('object:property-change:accessible-name',
+                   'object:children-changed')
+
+# The events after which nodes may be found by other search paths:
+searchPathEventTypes = labelEventTypes + \
+    ('object:property-change:accessible-parent',)
+
+# The events signalling that a window may have appeared:
+windowEventTypes = ('window:create', 'window:activate')
+
+# How many characters Node.typeText() inserts with a single call:
+insertChunkSize = 4096
+
+# The pools of worker threads for parallel searches, by number of threads:
+searchPools = {}
+searchPoolLock = threading.Lock()
+
+# libatspi's connection to the applications isn't thread-safe, so the worker
+# threads of parallel searches hold this while they make calls through it:
+atspiLock = threading.Lock()
+
+
+def getSearchPool(threads):
+    """
+    Get the pool of worker threads for parallel searches, with the given
+    number of threads. Pools are kept around between searches, and never
+    closed, since another search may still be using one.
+    """
+    with searchPoolLock:
+        if threads not in searchPools:
+            searchPools[threads] = ThreadPool(threads)
+        return searchPools[threads]
+
+
+roleByName = {}
+
+
+def getRoleByName(roleName):
+    """
+    Get the AT-SPI role with the given (untranslated) name, as returned by
+    Node.roleName. Raises KeyError if there is no such role.
+    """
+    if not roleByName:
+        for value in range(int(pyatspi.Atspi.Role.LAST_DEFINED)):
+            role = pyatspi.Atspi.Role(value)
+            roleByName[pyatspi.Atspi.role_get_name(role)] = role
+    return roleByName[roleName]
+
+# The AT-SPI events that can make a failed search succeed on retry:
+searchEventTypes = ('object:children-changed',
+                    'object:property-change:accessible-name',
+                    'window:create')
+
+
 class SearchError(Exception):
     pass
 
@@ -181,8 +318,8 @@ class Action(object):
                 logger.log("Warning: " + str(nSE))
         if config.blinkOnActions:
             self.node.blink()
-        result = self.__action.doAction(self.__index)
-        doDelay(config.actionDelay)
+        with settling(self.node, config.actionDelay):
+            result = self.__action.doAction(self.__index)
         return result
 
 
@@ -221,16 +358,43 @@ class Node(object):
     @property
     def dead(self):
         """Is the node dead (defunct) ?"""
-        try:
-            if self.roleName == 'invalid':
+        if config.cacheLiveness:
+            return not livenessCache.isAlive(self, isAlive)
+        return not isAlive(self)
+
+    def waitUntilDead(self, timeout=None):
+        """
+        Wait for the node to die, for up to timeout seconds (by default
+        config.searchTimeout). The node is checked again whenever a child is
+        removed or an object becomes defunct anywhere, and every so often
+        in between. Returns whether the node died.
+        """
+        return self.__waitUntil(lambda: self.dead, deathEventTypes, timeout)
+
+    def waitUntilGone(self, timeout=None):
+        """
+        Wait for the node to either die or stop showing, as for
+        waitUntilDead(). Returns whether it did.
+        """
+        def gone():
+            if self.dead:
                 return True
-            self.role
-            self.name
-            if len(self) > 0:
-                self[0]
-        except:
-            return True
-        return False
+            try:
+                return not self.showing
+            except Exception:
+                return True
+        return self.__waitUntil(
+            gone, deathEventTypes + ('object:state-changed:showing',), timeout)
+
+    def __waitUntil(self, condition, eventTypes, timeout):
+        backoff = Backoff(timeout)
+        with EventWaiter(eventTypes) as waiter:
+            while not condition():
+                delay = backoff.next()
+                if delay <= 0:
+                    return False
+                waiter.wait(delay)
+        return True
 
     @property
     def children(self):
@@ -238,30 +402,59 @@ class Node(object):
         if self.parent and self.parent.roleName == 'hyper link':
             print(self.parent.role)
             return []
-        children = []
-        childCount = self.childCount
-        if childCount > config.childrenLimit:
-            global haveWarnedAboutChildrenLimit
-            if not haveWarnedAboutChildrenLimit:
-                logger.log("Only returning %s children. You may change "
-                           "config.childrenLimit if you wish. This message will only"
-                           " be printed once." % str(config.childrenLimit))
-                haveWarnedAboutChildrenLimit = True
+        return list(self.iterChildren(hypertext=True))
+
+    def iterChildren(self, pageSize=None, hypertext=False):
+        """
+        Generate this Accessible's children, fetching each one only when it is
+        needed, so that callers looking for a particular child can stop at
+        it. At most config.childrenLimit children are generated.
+
+        If pageSize is given, the children are fetched that many at a time,
+        and the child count is checked again before every page, so that
+        children being added or removed meanwhile are followed.
+
+        If hypertext is True, the objects of the links in the node's
+        hypertext (if any) are generated as well, after the children.
+        """
+        def limit(childCount):
+            if childCount > config.childrenLimit:
+                global haveWarnedAboutChildrenLimit
+                if not haveWarnedAboutChildrenLimit:
+                    logger.log("Only returning %s children. You may change "
+                               "config.childrenLimit if you wish. This message will only"
+                               " be printed once." % str(config.childrenLimit))
+                    haveWarnedAboutChildrenLimit = True
                 childCount = config.childrenLimit
-        for i in range(childCount):
-            # Workaround for GNOME bug #465103
-            # also solution for GNOME bug #321273
-            try:
-                child = self[i]
-            except LookupError:
-                child = None
-            if child:
-                children.append(child)
+            return childCount
+
+        childCount = limit(self.childCount)
+        invalidChildren = 0
+        index = 0
+        while index < childCount:
+            end = childCount
+            if pageSize:
+                end = min(childCount, index + pageSize)
+            for i in xrange(index, end):
+                # Workaround for GNOME bug #465103
+                # also solution for GNOME bug #321273
+                try:
+                    child = self[i]
+                except LookupError:
+                    child = None
+                if child:
+                    yield child
+                else:
+                    invalidChildren += 1
+            index = end
+            if pageSize and index < childCount:
+                childCount = limit(self.childCount)
 
-        invalidChildren = childCount - len(children)
         if invalidChildren and config.debugSearching:
             logger.log("Skipped %s invalid children of %s" %
                        (invalidChildren, str(self)))
+        if not hypertext:
+            return
         try:
             ht = self.queryHypertext()
             for li in range(ht.getNLinks()):
@@ -274,12 +467,10 @@ class Node(object):
                                    hypertext=ht,
                                    linkIndex=li,
                                    anchorIndex=ai)
-                    children.append(child)
+                    yield child
         except NotImplementedError:
             pass
 
-        return children
-
     roleName = property(Accessibility.Accessible.getRoleName)
 
     role = property(Accessibility.Accessible.getRole)
@@ -329,11 +520,29 @@ class Node(object):
         def fset(self, value):
             logger.log("Setting combobox %s to '%s'" % (self.getLogString(),
                                                         value))
-            self.childNamed(childName=value).doActionNamed('click')
-            doDelay()
+            with settling(self, config.defaultDelay,
+                          until=lambda: self.name == value):
+                self.childNamed(childName=value).doActionNamed('click')
 
         return property(**locals())
     combovalue = combovalue()
+
+    #
+    # Table
+    #
+
+    @property
+    def table(self):
+        """
+        For instances with an AccessibleTable interface, a Table giving access
+        to the cells by row and column, without going through (or being
+        limited by) the list of children. None otherwise.
+        """
+        try:
+            return Table(self, self.queryTable())
+        except NotImplementedError:
+            return None
+
     #
     # Hypertext and Hyperlink
     #
@@ -570,14 +779,14 @@ class Node(object):
 
     def selectAll(self):
         """Selects all children."""
-        result = self.querySelection().selectAll()
-        doDelay()
+        with settling(self, config.defaultDelay):
+            result = self.querySelection().selectAll()
         return result
 
     def deselectAll(self):
         """Deselects all selected children."""
-        result = self.querySelection().clearSelection()
-        doDelay()
+        with settling(self, config.defaultDelay):
+            result = self.querySelection().clearSelection()
         return result
 
     def select(self):
@@ -586,8 +795,9 @@ class Node(object):
             parent = self.parent
         except AttributeError:
             raise NotImplementedError
-        result = parent.querySelection().selectChild(self.indexInParent)
-        doDelay()
+        with settling(self, config.defaultDelay,
+                      until=lambda: self.selected):
+            result = parent.querySelection().selectChild(self.indexInParent)
         return result
 
     def deselect(self):
@@ -596,8 +806,9 @@ class Node(object):
             parent = self.parent
         except AttributeError:
             raise NotImplementedError
-        result = parent.querySelection().deselectChild(self.indexInParent)
-        doDelay()
+        with settling(self, config.defaultDelay,
+                      until=lambda: not self.selected):
+            result = parent.querySelection().deselectChild(self.indexInParent)
         return result
 
     @property
@@ -666,11 +877,26 @@ class Node(object):
         except NotImplementedError:
             pass
 
-    def typeText(self, string):
+    def typeText(self, string, method=None):
         """
         Type the given text into the node, with appropriate delays and
         logging.
-        """
+
+        If method (config.typeTextMethod by default) is 'insert', the text is
+        inserted at the caret through the EditableText interface, rather than
+        typed key by key, unless the node doesn't support that or the text
+        doesn't turn up as expected.
+        """
+        if method is None:
+            method = config.typeTextMethod
+        if method == 'insert':
+            logger.log("Inserting text into %s: '%s'" %
+                       (self.getLogString(), string))
+            with settling(self, config.defaultDelay):
+                inserted = self.__insertText(string)
+            if inserted:
+                return
+            logger.log("Inserting text failed; typing it instead")
         logger.log("Typing text into %s: '%s'" % (self.getLogString(), string))
 
         if self.focusable:
@@ -687,6 +913,38 @@ class Node(object):
             self.caretOffset += len(string)
             doDelay()
 
+    def __insertText(self, string):
+        """
+        Insert the string at the caret in chunks, through the EditableText
+        interface, and check that the text now is what it should be. If it
+        isn't (for example, because the widget filters or masks its input),
+        the previous text is restored. Returns whether the insertion worked.
+        """
+        try:
+            editableText = self.queryEditableText()
+            text = self.queryText()
+        except NotImplementedError:
+            return False
+        if not isinstance(string, unicode):
+            string = string.decode('utf-8')
+        try:
+            before = safeDecode(text.getText(0, -1))
+            start = offset = text.caretOffset
+            for index in xrange(0, len(string), insertChunkSize):
+                chunk = string[index:index + insertChunkSize]
+                encoded = chunk.encode('utf-8')
+                editableText.insertText(offset, encoded, len(encoded))
+                offset += len(chunk)
+            expected = before[:start] + string + before[start:]
+            if safeDecode(text.getText(0, -1)) == expected:
+                text.setCaretOffset(offset)
+                return True
+            editableText.setTextContents(before.encode('utf-8'))
+            text.setCaretOffset(start)
+        except GLib.GError:
+            pass
+        return False
+
     def keyCombo(self, comboString):
         if config.debugSearching:
             logger.log("Pressing keys '%s' into %s" %
@@ -742,70 +1000,67 @@ class Node(object):
         FIXME: try to ensure uniqueness
         FIXME: need some heuristics to get 'good' searches, whatever
         that means
+
+        The paths are remembered (see SearchPathCache), so asking again, or
+        for a node below this one, is cheap.
         """
         if config.debugSearchPaths:
             logger.log("getAbsoluteSearchPath(%s)" % self)
+        return searchPathCache.get(self)
 
-        if self.roleName == 'application':
-            result = path.SearchPath()
-            result.append(predicate.IsAnApplicationNamed(self.name), False)
-            return result
-        else:
-            if self.parent:
-                (ancestor, pred, isRecursive) = self.getRelativeSearch()
-                if config.debugSearchPaths:
-                    logger.log("got ancestor: %s" % ancestor)
-
-                ancestorPath = ancestor.getAbsoluteSearchPath()
-                ancestorPath.append(pred, isRecursive)
-                return ancestorPath
-            else:
-                # This should be the root node:
-                return path.SearchPath()
-
-    def getRelativeSearch(self):
+    def getRelativeSearch(self, searchPass=None):
         """
         Get a (ancestorNode, predicate, isRecursive) triple that identifies the
         best way to find this Node uniquely.
         FIXME: or None if no such search exists?
         FIXME: may need to make this more robust
         FIXME: should this be private?
+
+        If a SearchPass is given, the properties of this node and its
+        ancestors are read from (and remembered in) its snapshots.
         """
         if config.debugSearchPaths:
             logger.log("getRelativeSearchPath(%s)" % self)
+        if searchPass is None:
+            searchPass = SearchPass()
+        node = searchPass.snapshot(self)
 
         assert self
-        assert self.parent
+        assert node.parent
 
         isRecursive = False
-        ancestor = self.parent
+        ancestor = node.parent
+        seen = set([self])
 
         # iterate up ancestors until you reach an identifiable one,
         # setting the search to be isRecursive if need be:
-        while not self.__nodeIsIdentifiable(ancestor):
+        while not self.__nodeIsIdentifiable(ancestor) and \
+                ancestor.node not in seen:
+            seen.add(ancestor.node)
             ancestor = ancestor.parent
             isRecursive = True
+        ancestor = ancestor.node
 
         # Pick the most appropriate predicate for finding this node:
-        if self.labellee:
-            if self.labellee.name:
-                return (ancestor, predicate.IsLabelledAs(self.labellee.name), isRecursive)
-
-        if self.roleName == 'menu':
-            return (ancestor, predicate.IsAMenuNamed(self.name), isRecursive)
-        elif self.roleName == 'menu item' or self.roleName == 'check menu item':
-            return (ancestor, predicate.IsAMenuItemNamed(self.name), isRecursive)
-        elif self.roleName == 'text':
-            return (ancestor, predicate.IsATextEntryNamed(self.name), isRecursive)
-        elif self.roleName == 'push button':
-            return (ancestor, predicate.IsAButtonNamed(self.name), isRecursive)
-        elif self.roleName == 'frame':
-            return (ancestor, predicate.IsAWindowNamed(self.name), isRecursive)
-        elif self.roleName == 'dialog':
-            return (ancestor, predicate.IsADialogNamed(self.name), isRecursive)
+        if node.labellee:
+            if node.labellee.name:
+                return (ancestor, predicate.IsLabelledAs(node.labellee.name), isRecursive)
+
+        if node.roleName == 'menu':
+            return (ancestor, predicate.IsAMenuNamed(node.name), isRecursive)
+        elif node.roleName == 'menu item' or node.roleName == 'check menu item':
+            return (ancestor, predicate.IsAMenuItemNamed(node.name), isRecursive)
+        elif node.roleName == 'text':
+            return (ancestor, predicate.IsATextEntryNamed(node.name), isRecursive)
+        elif node.roleName == 'push button':
+            return (ancestor, predicate.IsAButtonNamed(node.name), isRecursive)
+        elif node.roleName == 'frame':
+            return (ancestor, predicate.IsAWindowNamed(node.name), isRecursive)
+        elif node.roleName == 'dialog':
+            return (ancestor, predicate.IsADialogNamed(node.name), isRecursive)
         else:
             pred = predicate.GenericPredicate(
-                name=self.name, roleName=self.roleName)
+                name=node.name, roleName=node.roleName)
             return (ancestor, pred, isRecursive)
 
     def __nodeIsIdentifiable(self, ancestor):
@@ -818,27 +1073,355 @@ class Node(object):
         else:
             return False
 
-    def _fastFindChild(self, pred, recursive=True):
+    def _findDescendantsByRole(self, pred, searchPass):
         """
-        Searches for an Accessible using methods from pyatspi.utils
+        Use the AT-SPI Collection interface to get all descendants that have
+        one of the roles (and all of the states) required by the predicate, in
+        depth-first order. The filtering is done by the application, so this
+        takes a handful of calls rather than several for every descendant.
+
+        Returns None if the predicate doesn't restrict the role, or if the
+        application doesn't support the Collection interface; the caller then
+        has to walk the tree itself.
         """
-        if isinstance(pred, predicate.Predicate):
-            pred = pred.satisfiedByNode
-        if not recursive:
-            cIter = iter(self)
+        if not config.searchUseCollection:
+            return None
+        if not isinstance(pred, predicate.Predicate) or not pred.requiredRoleNames:
+            return None
+        roles = []
+        for roleName in pred.requiredRoleNames:
+            try:
+                roles.append(getRoleByName(roleName))
+            except KeyError:
+                return None
+        try:
+            collection = self.queryCollection()
+            states = pyatspi.StateSet()
+            for state in pred.requiredStates or ():
+                states.add(state)
+            rule = collection.createMatchRule(
+                states, collection.MATCH_ALL,
+                [], collection.MATCH_ANY,
+                roles, collection.MATCH_ANY,
+                [], collection.MATCH_ALL,
+                False)
+            matches = collection.getMatches(
+                rule, collection.SORT_ORDER_CANONICAL, 0, True)
+        except (NotImplementedError, GLib.GError):
+            return None
+        if len(pred.requiredRoleNames) == 1:
+            # We know the role of all of these already:
+            for match in matches:
+                searchPass.seed(match, roleName=pred.requiredRoleNames[0])
+        return matches
+
+    def _findLabelledDescendants(self, pred):
+        """
+        Find the descendants that may be labelled as the predicate requires,
+        by looking up the labels with matching names in the LabelIndex, in
+        depth-first order.
+
+        Returns None if the predicate doesn't search by label, or if no
+        matching label was found. The nodes are only worth checking first: if
+        none of them satisfy the predicate, the node may still be labelled by
+        something other than a label, so the caller has to walk the tree
+        itself.
+        """
+        if not config.searchUseLabelIndex:
+            return None
+        if not isinstance(pred, predicate.Predicate) or pred.requiredLabel is None:
+            return None
+        targets = []
+        for (labelName, labelTargets) in labelIndex.targets(self):
+            if pred.requiredLabel.matchedBy(labelName):
+                targets.extend(target for target in labelTargets
+                               if target not in targets)
+        positioned = []
+        for target in targets:
+            position = self._positionOf(target)
+            if position is not None:
+                positioned.append((position, target))
+        if not positioned:
+            return None
+        positioned.sort()
+        return [target for (_, target) in positioned]
+
+    def _positionOf(self, node):
+        """
+        Get the list of child indexes leading from this node down to the given
+        descendant, or None if it isn't a descendant.
+        """
+        position = []
+        try:
+            while node != self:
+                parent = node.parent
+                if parent is None:
+                    return None
+                position.append(node.indexInParent)
+                node = parent
+        except (LookupError, GLib.GError):
+            return None
+        position.reverse()
+        return position
+
+    def _iterDescendants(self, strategy='dfs', maxDepth=None, prune=None,
+                         depths=False):
+        """
+        Generate the descendants of this node, either depth-first (in the same
+        order as pyatspi.utils.findDescendant) or breadth-first. If maxDepth is
+        given, only descend that many levels below this node; a maxDepth of 1
+        generates just the children.
+
+        If prune is given, it is called on every node generated, and the
+        children of the nodes for which it returns True are skipped.
+
+        If depths is True, (node, depth) pairs are generated instead, where
+        the children of this node have a depth of 1.
+        """
+        if maxDepth is not None and maxDepth < 1:
+            return
+
+        def descend(node):
+            if prune is None:
+                return True
+            try:
+                return not prune(node)
+            except Exception:
+                return True
+
+        if strategy == 'bfs':
+            queue = deque([(self, 0)])
+            while queue:
+                (node, depth) = queue.popleft()
+                if maxDepth is not None and depth >= maxDepth:
+                    continue
+                for child in node:
+                    if child is not None:
+                        yield (child, depth + 1) if depths else child
+                        if descend(child):
+                            queue.append((child, depth + 1))
+        elif strategy == 'dfs':
+            stack = [iter(self)]
+            while stack:
+                try:
+                    child = stack[-1].next()
+                except StopIteration:
+                    stack.pop()
+                    continue
+                if child is not None:
+                    yield (child, len(stack)) if depths else child
+                    if (maxDepth is None or len(stack) < maxDepth) and \
+                            descend(child):
+                        stack.append(iter(child))
+        else:
+            raise ValueError("Unknown search strategy: '%s'" % strategy)
+
+    def _searchInParallel(self, pred, threads, strategy='dfs', maxDepth=None,
+                          prune=None):
+        """
+        Generate the descendants of this node that satisfy the predicate
+        function, in the same order as a serial search, by searching separate
+        subtrees on a pool of threads. The time taken by such a search is
+        dominated by waiting for replies from the application, so having many
+        requests in flight at once pays off despite the GIL.
+
+        The tree is first split into enough subtrees to keep the threads busy,
+        by expanding the topmost ones level by level. The results of each
+        subtree are then collected in order, so a depth-first search can
+        generate the matches in the first subtree while the others are still
+        being searched; a breadth-first search has to wait for all of them.
+
+        The threads take turns at calling the application, holding atspiLock,
+        since libatspi's connection isn't thread-safe. Once the caller stops
+        taking matches (e.g. findChild has found one), the subtrees that are
+        still being searched are abandoned, and the threads are waited for,
+        so that none of them is still calling the application afterwards.
+        """
+        stopped = threading.Event()
+
+        def descend(node):
+            if prune is None:
+                return True
+            try:
+                return not prune(node)
+            except Exception:
+                return True
+
+        # Tasks are (node, depth, searchSubtree); a node whose children were
+        # split off into separate tasks only has itself checked.
+        tasks = [(child, 1, True) for child in self if child is not None]
+        for depth in xrange(1, maxDepth or sys.maxsize):
+            subtrees = len([task for task in tasks if task[2]])
+            if subtrees == 0 or subtrees >= threads:
+                break
+            expanded = []
+            for (node, nodeDepth, searchSubtree) in tasks:
+                if not searchSubtree or nodeDepth != depth:
+                    expanded.append((node, nodeDepth, searchSubtree))
+                    continue
+                expanded.append((node, nodeDepth, False))
+                if descend(node):
+                    expanded.extend((child, depth + 1, True) for child in node
+                                    if child is not None)
+            tasks = expanded
+
+        def search(task):
+            (node, depth, searchSubtree) = task
+            searchPass = SearchPass()
+            check = searchPass.wrap(pred)
+
+            def iterCandidates():
+                yield (node, depth)
+                if searchSubtree and descend(node):
+                    pruner = searchPass.wrap(prune) if prune else None
+                    for (descendant, descendantDepth) in node._iterDescendants(
+                            strategy, maxDepth and maxDepth - depth, pruner,
+                            depths=True):
+                        yield (descendant, depth + descendantDepth)
+            candidates = iterCandidates()
+            matches = []
+            while not stopped.is_set():
+                # Both walking the tree and checking nodes call the
+                # application:
+                with atspiLock:
+                    try:
+                        (candidate, candidateDepth) = next(candidates)
+                    except StopIteration:
+                        break
+                    try:
+                        if check(candidate):
+                            matches.append((candidate, candidateDepth))
+                    except Exception:
+                        pass
+            return matches
+
+        taskResults = getSearchPool(threads).imap(search, tasks)
+        results = taskResults
+        try:
+            if strategy == 'bfs':
+                # The tasks are in depth-first order, which is the
+                # breadth-first order of the nodes at any given depth:
+                matches = [match for taskMatches in results
+                           for match in taskMatches]
+                matches.sort(key=lambda match: match[1])
+                results = [matches]
+            for taskMatches in results:
+                for (match, depth) in taskMatches:
+                    yield match
+        finally:
+            stopped.set()
             while True:
                 try:
-                    child = cIter.next()
+                    next(taskResults)
                 except StopIteration:
                     break
-                if child is not None:
-                    if pred(child):
-                        return child
+                except Exception:
+                    pass
+
+    def _searchMatches(self, pred, recursive=True, strategy=None, maxDepth=None,
+                       prune=None, threads=None):
+        """
+        Generate the children (or descendants, if recursive is True) of this
+        node that satisfy the predicate, in search order. Errors raised by the
+        predicate are taken to mean that the node doesn't satisfy it.
+        """
+        if strategy is None:
+            strategy = config.searchStrategy
+        if threads is None:
+            threads = config.searchThreads
+        if not recursive:
+            maxDepth = 1
+        elif maxDepth is None:
+            maxDepth = config.searchMaxDepth
+        predicateObject = pred
+        pred = nodeFunction(pred)
+        pred = stats.countVisits(pred)
+        treeMirror = mirror.mirrorFor(self)
+        if treeMirror is not None:
+            # The mirror's entries already hold the properties predicates need:
+            pruner = makePruner(prune)
+            entries = treeMirror.lookup(self, predicateObject, strategy,
+                                        maxDepth, pruner)
+            if entries is None:
+                entries = treeMirror.iterDescendants(self, strategy, maxDepth,
+                                                     pruner)
+            for entry in entries:
+                try:
+                    if pred(entry):
+                        yield entry.node
+                except Exception:
+                    pass
+            return
+        searchPass = SearchPass()
+        candidates = None
+        if strategy == 'dfs' and maxDepth is None and prune is None:
+            candidates = self._findDescendantsByRole(predicateObject,
+                                                     searchPass)
+        if candidates is None and threads > 1 and recursive:
+            for match in self._searchInParallel(pred, threads, strategy,
+                                                maxDepth, makePruner(prune)):
+                yield match
+            return
+        if candidates is None:
+            pruner = makePruner(prune)
+            if pruner is not None:
+                pruner = searchPass.wrap(pruner)
+            candidates = self._iterDescendants(strategy, maxDepth, pruner)
+        pred = searchPass.wrap(pred)
+        for candidate in candidates:
+            try:
+                if pred(candidate):
+                    yield candidate
+            except Exception:
+                pass
+
+    def _fastFindChild(self, pred, recursive=True, strategy=None, maxDepth=None,
+                       prune=None, threads=None):
+        """
+        Searches for an Accessible satisfying the predicate, returning the first
+        one found or None.
+        """
+        if recursive and prune is None and maxDepth is None and \
+                config.searchMaxDepth is None and \
+                (strategy or config.searchStrategy) == 'dfs' and \
+                mirror.mirrorFor(self) is None:
+            # Try the nodes the matching labels are for before walking the tree:
+            satisfied = stats.countVisits(nodeFunction(pred))
+            for candidate in self._findLabelledDescendants(pred) or ():
+                try:
+                    if satisfied(candidate):
+                        return candidate
+                except Exception:
+                    pass
+        matches = self._searchMatches(pred, recursive, strategy, maxDepth,
+                                      prune, threads)
+        try:
+            for result in matches:
+                return result
+        finally:
+            # Stop any parallel search from walking the rest of the tree:
+            matches.close()
+
+    def _searchEventWaiter(self, eventTypes=searchEventTypes):
+        """
+        Create an EventWaiter that fires on events which could make a search
+        below this node succeed (by default children being added or removed,
+        names changing, and windows being created). Only events coming from
+        the application this node belongs to are relevant, unless this node
+        is the root.
+        """
+        if self.parent is None:
+            eventFilter = None
         else:
-            return pyatspi.utils.findDescendant(self, pred)
+            application = self.getApplication()
+
+            def eventFilter(event):
+                return event.host_application == application
+        return EventWaiter(eventTypes, eventFilter)
 
     def findChild(self, pred, recursive=True, debugName=None,
-                  retry=True, requireResult=True):
+                  retry=True, requireResult=True, strategy=None, maxDepth=None,
+                  prune=None, threads=None, timeout=None):
         """
         Search for a node satisyfing the predicate, returning a Node.
 
@@ -848,8 +1431,28 @@ class Node(object):
 
         If retry is False, it gives up after one attempt.
 
+        timeout is the time in seconds after which to give up retrying,
+        defaulting to config.searchTimeout. It is a deadline: a search whose
+        attempts are slow doesn't get any more time.
+
         If requireResult is True (the default), an exception is raised after all
         attempts have failed. If it is false, the function simply returns None.
+
+        strategy is either 'dfs' (depth-first) or 'bfs' (breadth-first), and
+        maxDepth limits how many levels below this node a recursive search
+        goes. They default to config.searchStrategy and config.searchMaxDepth.
+        A breadth-first search finds shallow nodes without first exploring
+        every deep subtree in front of them.
+
+        prune is a predicate (or a list of predicates) deciding which subtrees
+        to skip: the search doesn't descend into the children of any node
+        satisfying it, although the node itself is still checked. See e.g.
+        predicate.IsNotShowing, predicate.IsATable and
+        predicate.IsAnInactiveWindow.
+
+        threads is the number of threads a recursive search is spread across,
+        defaulting to config.searchThreads. Searches are serial unless it is
+        greater than 1. The result is the same either way.
         """
         def describeSearch(parent, pred, recursive, debugName):
             """
@@ -865,67 +1468,84 @@ class Node(object):
 
         assert isinstance(pred, predicate.Predicate)
         numAttempts = 0
-        while numAttempts < config.searchCutoffCount:
-            if numAttempts >= config.searchWarningThreshold or config.debugSearching:
-                logger.log("searching for %s (attempt %i)" %
-                           (describeSearch(self, pred, recursive, debugName), numAttempts))
-
-            result = self._fastFindChild(pred.satisfiedByNode, recursive)
-            if result:
-                assert isinstance(result, Node)
-                if debugName:
-                    result.debugName = debugName
+        waiter = None
+        backoff = Backoff(timeout)
+        record = stats.searchStarted(
+            lambda: describeSearch(self, pred, recursive, debugName))
+        result = None
+        try:
+            while True:
+                if backoff.warningDue() or config.debugSearching:
+                    logger.log("searching for %s (attempt %i)" %
+                               (describeSearch(self, pred, recursive, debugName), numAttempts))
+
+                result = self._fastFindChild(
+                    pred, recursive, strategy, maxDepth, prune, threads)
+                if result:
+                    assert isinstance(result, Node)
+                    if debugName:
+                        result.debugName = debugName
+                    else:
+                        result.debugName = pred.describeSearchResult()
+                    return result
                 else:
-                    result.debugName = pred.describeSearchResult()
-                return result
-            else:
-                if not retry:
-                    break
-                numAttempts += 1
-                if config.debugSearching or config.debugSleep:
-                    logger.log("sleeping for %f" %
-                               config.searchBackoffDuration)
-                sleep(config.searchBackoffDuration)
+                    if not retry:
+                        break
+                    numAttempts += 1
+                    delay = backoff.next()
+                    if delay <= 0:
+                        break
+                    sleepStart = time()
+                    if config.searchWaitForEvents:
+                        # Wake up as soon as something changes below us; the
+                        # backoff delay only bounds the wait.
+                        if waiter is None:
+                            waiter = self._searchEventWaiter()
+                            waiter.register()
+                        if config.debugSearching or config.debugSleep:
+                            logger.log("waiting for events for up to %f" %
+                                       delay)
+                        waiter.wait(delay)
+                    else:
+                        if config.debugSearching or config.debugSleep:
+                            logger.log("sleeping for %f" % delay)
+                        sleep(delay)
+                    stats.searchRetried(record, time() - sleepStart)
+        finally:
+            if waiter:
+                waiter.deregister()
+            stats.searchFinished(record, bool(result))
         if requireResult:
             raise SearchError(describeSearch(self, pred, recursive, debugName))
 
     # The canonical "search for multiple" method:
-    def findChildren(self, pred, recursive=True, isLambda=False):
+    def findChildren(self, pred, recursive=True, isLambda=False,
+                     strategy=None, maxDepth=None, prune=None, threads=None):
         """
         Find all children/descendents satisfying the predicate.
-        """
-        if isLambda is True:
-            nodes = self.findChildren(predicate.GenericPredicate(), recursive=recursive)
-            result = []
-            for node in nodes:
-                try:
-                    if pred(node):
-                        result.append(node)
-                except:
-                    pass
-            return result
-        if isinstance(pred, predicate.Predicate):
-            pred = pred.satisfiedByNode
-        if not recursive:
-            cIter = iter(self)
-            result = []
-            while True:
-                try:
-                    child = cIter.next()
-                except StopIteration:
-                    break
-                if child is not None and pred(child):
-                    result.append(child)
-            return result
-        else:
-            descendants = []
+
+        strategy, maxDepth, prune and threads are as for findChild.
+        """
+        # Functions (isLambda or not) are checked as the tree is walked, like
+        # predicates, rather than against a list of every node:
+        def describe():
+            if isLambda is not True and isinstance(pred, predicate.Predicate):
+                return pred.describeSearchResult()
+            return "satisfying %s" % getattr(pred, '__name__', pred)
+        record = stats.searchStarted(lambda: "%s of %s: %s" % (
+            "descendents" if recursive else "children", self.getLogString(),
+            describe()))
+        result = []
+        try:
             while True:
                 try:
-                    descendants = pyatspi.utils.findAllDescendants(self, pred)
-                    break
+                    result = list(self._searchMatches(pred, recursive, strategy,
+                                                      maxDepth, prune, threads))
+                    return result
                 except GLib.GError:
                     continue
-            return descendants
+        finally:
+            stats.searchFinished(record, bool(result))
 
     # The canonical "search above this node" method:
     def findAncestor(self, pred):
@@ -934,6 +1554,15 @@ class Node(object):
         satisfying the predicate, or None.
         """
         assert isinstance(pred, predicate.Predicate)
+        treeMirror = mirror.mirrorFor(self)
+        if treeMirror is not None:
+            satisfiedByNode = nodeFunction(pred)
+            for candidate in treeMirror.iterAncestors(self):
+                if satisfiedByNode(candidate):
+                    if isinstance(candidate, mirror.MirrorEntry):
+                        candidate = candidate.node
+                    return candidate
+            return None
         candidate = self.parent
         while candidate is not None:
             if candidate.satisfies(pred):
@@ -944,7 +1573,8 @@ class Node(object):
         return None
 
     # Various wrapper/helper search methods:
-    def child(self, name='', roleName='', description='', label='', recursive=True, retry=True, debugName=None):
+    def child(self, name='', roleName='', description='', label='', recursive=True, retry=True, debugName=None,
+              strategy=None, maxDepth=None, prune=None, timeout=None):
         """
         Finds a child satisying the given criteria.
 
@@ -952,9 +1582,11 @@ class Node(object):
         if no such child is found, and will eventually raise an exception. It
         also logs the search.
         """
-        return self.findChild(predicate.GenericPredicate(name=name, roleName=roleName, description=description, label=label), recursive=recursive, retry=retry, debugName=debugName)
+        return self.findChild(predicate.GenericPredicate(name=name, roleName=roleName, description=description, label=label), recursive=recursive, retry=retry, debugName=debugName,
+                              strategy=strategy, maxDepth=maxDepth, prune=prune, timeout=timeout)
 
-    def isChild(self, name='', roleName='', description='', label='', recursive=True, retry=False, debugName=None):
+    def isChild(self, name='', roleName='', description='', label='', recursive=True, retry=False, debugName=None,
+                strategy=None, maxDepth=None, prune=None, timeout=None):
         """
         Determines whether a child satisying the given criteria exists.
 
@@ -969,7 +1601,8 @@ class Node(object):
             self.findChild(
                 predicate.GenericPredicate(
                     name=name, roleName=roleName, description=description, label=label),
-                recursive=recursive, retry=retry, debugName=debugName)
+                recursive=recursive, retry=retry, debugName=debugName,
+                strategy=strategy, maxDepth=maxDepth, prune=prune, timeout=timeout)
         except SearchError:
             found = False
         return found
@@ -1056,11 +1689,10 @@ class Node(object):
         if self.description:
             result.append(self.description)
         try:
-            children = self.children
+            for child in self.iterChildren(hypertext=True):
+                result.extend(child.getUserVisibleStrings())
         except Exception:
-            return result
-        for child in children:
-            result.extend(child.getUserVisibleStrings())
+            pass
         return result
 
     def blink(self):
@@ -1097,6 +1729,445 @@ class LinkAnchor(object):
         return self.link.getURI(self.anchorIndex)
 
 
+class Table(object):
+
+    """
+    Access to the cells of a table (or tree table, or list) by row and column,
+    through the AT-SPI Table interface. Cells are only fetched when they are
+    asked for, so a search through one column of a table with thousands of
+    rows takes one call per row, rather than enumerating every cell.
+
+    Columns can be given by index, or by the name of the column (its header
+    or description).
+    """
+
+    def __init__(self, node, table):
+        self.node = node
+        self.__table = table
+        self.__columnNames = None
+
+    @property
+    def rowCount(self):
+        return self.__table.nRows
+
+    @property
+    def columnCount(self):
+        return self.__table.nColumns
+
+    def __len__(self):
+        return self.rowCount
+
+    @property
+    def columnNames(self):
+        """The names of the columns, from their headers or descriptions."""
+        if self.__columnNames is None:
+            self.__columnNames = self.__getColumnNames()
+        return self.__columnNames
+
+    def __getColumnNames(self):
+        names = []
+        for column in xrange(self.columnCount):
+            name = ''
+            try:
+                header = self.__table.getColumnHeader(column)
+                if header is not None:
+                    name = header.name
+            except (NotImplementedError, GLib.GError):
+                pass
+            if not name:
+                name = self.__table.getColumnDescription(column)
+            names.append(name)
+        return names
+
+    def columnIndex(self, column):
+        """
+        Get the index of the column, given as an index or a name. Raises
+        KeyError if there is no column with that name.
+        """
+        if isinstance(column, (int, long)):
+            return column
+        try:
+            return self.columnNames.index(column)
+        except ValueError:
+            raise KeyError(column)
+
+    def cellAt(self, row, column):
+        """Get the cell at the given row and column, as a Node."""
+        return self.__table.getAccessibleAt(row, self.columnIndex(column))
+
+    def row(self, row):
+        """Get the TableRow with the given index."""
+        return TableRow(self, row)
+
+    def rows(self, start=0, pageSize=None):
+        """
+        Generate the rows of the table, as TableRows, starting at row start.
+        If pageSize is given, the row count is checked again after each
+        page of that many rows, so that rows being added (or removed) are
+        followed.
+        """
+        rowCount = self.rowCount
+        index = start
+        while index < rowCount:
+            yield TableRow(self, index)
+            index += 1
+            if pageSize and (index - start) % pageSize == 0:
+                rowCount = self.rowCount
+
+    def findRows(self, pred, column=None, start=0, pageSize=None):
+        """
+        Generate the rows that have a cell satisfying the predicate (a
+        Predicate, or a function taking a node). If column is given, only the
+        cells in that column are checked, and no others are fetched.
+        """
+        if isinstance(pred, predicate.Predicate):
+            pred = pred.satisfiedByNode
+        if column is not None:
+            column = self.columnIndex(column)
+        for row in self.rows(start, pageSize):
+            if column is not None:
+                cells = [row.cell(column)]
+            else:
+                cells = row.cells
+            for cell in cells:
+                try:
+                    if cell is not None and pred(cell):
+                        yield row
+                        break
+                except Exception:
+                    pass
+
+    def findRow(self, pred, column=None, start=0, pageSize=None):
+        """
+        Get the first row that has a cell satisfying the predicate, as for
+        findRows(), or None.
+        """
+        for row in self.findRows(pred, column, start, pageSize):
+            return row
+        return None
+
+    def positionOf(self, cell):
+        """
+        Get the (row, column) of a cell of the table, using the TableCell
+        interface where the cell supports it.
+        """
+        try:
+            (ok, row, column) = cell.queryTableCell().getPosition()
+            if ok:
+                return (row, column)
+        except (NotImplementedError, AttributeError, GLib.GError):
+            pass
+        index = cell.indexInParent
+        return (self.__table.getRowAtIndex(index),
+                self.__table.getColumnAtIndex(index))
+
+    def isRowSelected(self, row):
+        return self.__table.isRowSelected(row)
+
+    def selectRow(self, row):
+        return self.__table.addRowSelection(row)
+
+    def deselectRow(self, row):
+        return self.__table.removeRowSelection(row)
+
+
+class TableRow(object):
+
+    """
+    A row of a Table. Its cells are fetched when they are first asked for,
+    and remembered afterwards.
+    """
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+        self.__cells = {}
+
+    def cell(self, column):
+        """Get the cell in the given column (an index or a name)."""
+        column = self.table.columnIndex(column)
+        if column not in self.__cells:
+            self.__cells[column] = self.table.cellAt(self.index, column)
+        return self.__cells[column]
+
+    __getitem__ = cell
+
+    @property
+    def cells(self):
+        return [self.cell(column) for column in xrange(self.table.columnCount)]
+
+    def __iter__(self):
+        return iter(self.cells)
+
+    def __len__(self):
+        return self.table.columnCount
+
+    @property
+    def selected(self):
+        return self.table.isRowSelected(self.index)
+
+    def select(self):
+        return self.table.selectRow(self.index)
+
+    def deselect(self):
+        return self.table.deselectRow(self.index)
+
+    def __repr__(self):
+        return "<TableRow %d of %s>" % (self.index, self.table.node.getLogString())
+
+
+class NodeSnapshot(object):
+
+    """
+    A read-only view of a Node for the duration of a single search pass.
+
+    Each of the properties listed in 'cachedProperties' is fetched from the
+    Node (over D-Bus) the first time it is read and remembered afterwards, so
+    predicates and the search code itself can read them as often as they like
+    while costing only one round trip. Anything else is passed through to the
+    underlying Node.
+
+    Snapshots are deliberately short-lived: a fresh SearchPass is made for
+    every attempt, so that retries see the current state of the UI.
+    """
+    cachedProperties = ('name', 'roleName', 'role', 'description',
+                        'labeller', 'labellee', 'childCount', 'parent',
+                        'showing')
+
+    def __init__(self, node, searchPass=None):
+        self.__dict__['node'] = node
+        self.__dict__['searchPass'] = searchPass
+
+    def __getattr__(self, name):
+        if name in NodeSnapshot.cachedProperties:
+            value = getattr(self.node, name)
+            if isinstance(value, Node) and self.searchPass is not None:
+                value = self.searchPass.snapshot(value)
+            self.__dict__[name] = value
+            return value
+        return getattr(self.node, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("can't set attribute")
+
+    def __str__(self):
+        return str(self.node)
+
+
+class SearchPass(object):
+
+    """
+    Memoizes NodeSnapshot instances for the length of one search pass.
+    """
+
+    def __init__(self):
+        self.snapshots = {}
+
+    def seed(self, node, **properties):
+        """
+        Record property values of the given Node that are already known, so
+        that they don't have to be fetched.
+        """
+        self.snapshot(node).__dict__.update(properties)
+
+    def snapshot(self, node):
+        """
+        Get the NodeSnapshot of the given Node, creating it if need be.
+        """
+        if isinstance(node, NodeSnapshot):
+            return node
+        try:
+            return self.snapshots[node]
+        except KeyError:
+            result = NodeSnapshot(node, self)
+            self.snapshots[node] = result
+            return result
+
+    def wrap(self, pred):
+        """
+        Wrap a predicate function so that it is handed snapshots rather than
+        Nodes.
+        """
+        def satisfiedBySnapshot(node):
+            return pred(self.snapshot(node))
+        return satisfiedBySnapshot
+
+
+class EventScopedCache(object):
+
+    """
+    Values remembered for nodes, each until one of the given types of events
+    comes from the application the node belongs to (from any application,
+    for the root). Each value has its own EventWaiter, which is deregistered
+    as soon as the value is dropped. Only the maxEntries most recently used
+    values are kept, so that no more listeners than that are ever registered.
+    """
+
+    maxEntries = 16
+
+    def __init__(self, eventTypes):
+        self.eventTypes = eventTypes
+        # Node -> (value, EventWaiter), least recently used first:
+        self.entries = OrderedDict()
+
+    def get(self, node, compute):
+        """
+        Get the value for the node, calling compute() for it if need be.
+        """
+        pumpEvents()
+        for (key, (value, waiter)) in list(self.entries.items()):
+            if waiter.triggered:
+                self.drop(key)
+        if node in self.entries:
+            entry = self.entries.pop(node)
+        else:
+            # Listen from before the value is worked out, so that nothing is
+            # missed:
+            waiter = node._searchEventWaiter(self.eventTypes)
+            waiter.register()
+            try:
+                entry = (compute(), waiter)
+            except Exception:
+                waiter.deregister()
+                raise
+            while len(self.entries) >= self.maxEntries:
+                self.drop(next(iter(self.entries)))
+        self.entries[node] = entry
+        return entry[0]
+
+    def drop(self, node):
+        """
+        Forget the value for the node, if there is one.
+        """
+        entry = self.entries.pop(node, None)
+        if entry is not None:
+            entry[1].deregister()
+
+    def clear(self):
+        for node in list(self.entries):
+            self.drop(node)
+
+
+class LabelIndex(object):
+
+    """
+    For each search root, the nodes that the labels below it are labels for,
+    by the names of the labels. Searches for nodes by label look their label
+    up here, instead of fetching the relations of every node in the subtree.
+
+    A root's index is dropped whenever a name changes or children are added
+    or removed in its application (see EventScopedCache). There is no AT-SPI
+    event for relations changing, so the nodes looked up are always checked
+    against the predicate, which reads their actual labels.
+    """
+
+    def __init__(self):
+        self.indexes = EventScopedCache(labelEventTypes)
+
+    def targets(self, root):
+        """
+        Get the index for the given root, as a list of (label name, targets)
+        pairs, building it if need be.
+        """
+        return self.indexes.get(root, lambda: self.__build(root))
+
+    def __build(self, root):
+        isALabel = predicate.GenericPredicate(roleName='label')
+        labels = root._findDescendantsByRole(isALabel, SearchPass())
+        if labels is None:
+            labels = (node for node in root._iterDescendants()
+                      if node.roleName == 'label')
+        index = []
+        for label in labels:
+            try:
+                targets = label.labellee
+                if targets is None:
+                    continue
+                if not isinstance(targets, list):
+                    targets = [targets]
+                index.append((label.name, targets))
+            except (LookupError, GLib.GError):
+                pass
+        return index
+
+    def clear(self):
+        self.indexes.clear()
+
+
+labelIndex = LabelIndex()
+
+
+class SearchPathCache(object):
+
+    """
+    Remembers the absolute search paths of nodes (see
+    Node.getAbsoluteSearchPath()), for each application until a name, a
+    parent or the children of any of its nodes change (see EventScopedCache).
+    A node's path is worked out in a single pass up its ancestors, reading
+    each of their properties only once, and the paths of the ancestors on the
+    way are remembered too.
+    """
+
+    def __init__(self):
+        # Application -> {node: path}:
+        self.applicationPaths = EventScopedCache(searchPathEventTypes)
+
+    def get(self, node):
+        """
+        Get the search path of the node, working it out if need be. The
+        caller may modify the path it gets.
+        """
+        try:
+            application = node.getApplication() or root
+        except (LookupError, GLib.GError):
+            application = root
+        paths = self.applicationPaths.get(application, dict)
+        result = self.__find(node, paths)
+        return result.getPrefix(result.length())
+
+    def __find(self, node, paths):
+        searchPass = SearchPass()
+        snapshot = searchPass.snapshot(node)
+        # The searches leading down from the nearest ancestor whose path is
+        # known, or that starts a path, to the node:
+        steps = []
+        seen = set()
+        while True:
+            if snapshot.node in paths:
+                result = paths[snapshot.node]
+                break
+            seen.add(snapshot.node)
+            result = path.SearchPath()
+            if snapshot.roleName == 'application':
+                result.append(predicate.IsAnApplicationNamed(snapshot.name),
+                              False)
+                break
+            if not snapshot.parent:
+                # This should be the root node:
+                break
+            (ancestor, pred, isRecursive) = \
+                snapshot.node.getRelativeSearch(searchPass)
+            if config.debugSearchPaths:
+                logger.log("got ancestor: %s" % ancestor)
+            if ancestor in seen:
+                # The application reported a cycle of parents:
+                break
+            steps.append((snapshot.node, pred, isRecursive))
+            snapshot = searchPass.snapshot(ancestor)
+        paths[snapshot.node] = result
+        for (stepNode, pred, isRecursive) in reversed(steps):
+            result = result.getPrefix(result.length())
+            result.append(pred, isRecursive)
+            paths[stepNode] = result
+        return result
+
+    def clear(self):
+        self.applicationPaths.clear()
+
+
+searchPathCache = SearchPathCache()
+
+
 class Root (Node):
 
     """
@@ -1135,7 +2206,10 @@ class Application (Node):
 
         FIXME: should this method activate the dialog?
         """
-        return self.findChild(predicate.IsADialogNamed(dialogName=dialogName), recursive)
+        pred = predicate.IsADialogNamed(dialogName=dialogName)
+        if not recursive:
+            return self.waitForDialog(pred)
+        return self.findChild(pred, recursive)
 
     def window(self, windowName, recursive=False):
         """
@@ -1150,13 +2224,65 @@ class Application (Node):
         The window will be automatically activated (raised and focused
         by the window manager) if wnck bindings are available.
         """
-        result = self.findChild(
-            predicate.IsAWindowNamed(windowName=windowName), recursive)
+        pred = predicate.IsAWindowNamed(windowName=windowName)
+        if not recursive:
+            result = self.waitForWindow(pred)
+        else:
+            result = self.findChild(pred, recursive)
         # FIXME: activate the WnckWindow ?
         # if gotWnck:
         #       result.activate()
         return result
 
+    def waitForWindow(self, pred, timeout=None, requireResult=True):
+        """
+        Wait for a top-level window of this application satisfying the
+        predicate (or with the given name) to appear, and return it.
+
+        Rather than polling, this listens for the application's windows being
+        created or activated, and checks each of them as soon as the event
+        arrives; the children of the application are only searched again
+        every so often, in case an event is missed. Gives up after timeout
+        seconds (config.searchTimeout by default), raising a SearchError if
+        requireResult is True, or returning None otherwise.
+        """
+        if not isinstance(pred, predicate.Predicate):
+            pred = predicate.IsAWindowNamed(windowName=pred)
+        application = self
+
+        def eventFilter(event):
+            return event.host_application == application
+        backoff = Backoff(timeout)
+        with EventWaiter(windowEventTypes, eventFilter) as waiter:
+            while True:
+                result = self.findChild(pred, recursive=False, retry=False,
+                                        requireResult=False)
+                if result:
+                    return result
+                delay = backoff.next()
+                if delay <= 0:
+                    break
+                if waiter.wait(delay):
+                    window = waiter.lastEvent.source
+                    try:
+                        if window.parent == self and pred.satisfiedByNode(window):
+                            window.debugName = pred.describeSearchResult()
+                            return window
+                    except Exception:
+                        pass
+        if requireResult:
+            raise SearchError("child of %s: %s" % (self.getLogString(),
+                                                   pred.describeSearchResult()))
+
+    def waitForDialog(self, pred, timeout=None, requireResult=True):
+        """
+        Wait for a dialog of this application satisfying the predicate (or
+        with the given name) to appear, as for waitForWindow().
+        """
+        if not isinstance(pred, predicate.Predicate):
+            pred = predicate.IsADialogNamed(dialogName=pred)
+        return self.waitForWindow(pred, timeout, requireResult)
+
     def getWnckApplication(self):  # pragma: no cover
         """
         Get the wnck.Application instance for this application, or None
@@ -16,6 +16,7 @@ import subprocess
 import cairo
 import predicate
 import errno
+import random
 
 import gi
 gi.require_version('Gtk', '3.0')
@@ -24,7 +25,7 @@ gi.require_version('Gdk', '3.0')
 from gi.repository import Gtk
 from gi.repository import GObject
 from config import config
-from time import sleep
+from time import sleep, time
 from logging import debugLogger as logger
 from logging import TimeStamp
 from __builtin__ import file
@@ -84,17 +85,30 @@ def screenshot(file='screenshot.png', timeStamp=True):
     return path
 
 
+# The time in seconds it took each application started by run() to create its
+# first window, by pid:
+startupTimes = {}
+
+# The events signalling that an application may have finished starting up:
+startupEventTypes = ('object:children-changed:add', 'window:create')
+
+
 def run(string, timeout=config.runTimeout, interval=config.runInterval, desktop=None, dumb=False, appName=''):
     """
     Runs an application. [For simple command execution such as 'rm *', use os.popen() or os.system()]
-    If dumb is omitted or is False, polls at interval seconds until the application is finished starting, or until timeout is reached.
+    If dumb is omitted or is False, waits until the application is finished starting (has created its
+    first window, even if that is minimized or on another workspace), or until timeout is reached. The application is recognized by its pid, or failing
+    that (e.g. for applications started by wrapper scripts) by its name. The application being added
+    to the desktop and creating windows are noticed as they happen, and only the application concerned
+    is checked then; the whole desktop is checked at most every interval seconds, in case an event is
+    missed. The startup time is logged, and kept in startupTimes.
     If dumb is True, returns when timeout is reached.
     """
+    from events import EventWaiter
     if not desktop:
         from tree import root as desktop
     args = string.split()
     os.environ['GTK_MODULES'] = 'gail:atk-bridge'
-    pid = subprocess.Popen(args, env=os.environ).pid
 
     if not appName:
         appName = args[0]
@@ -102,26 +116,119 @@ def run(string, timeout=config.runTimeout, interval=config.runInterval, desktop=
     if dumb:
         # We're starting a non-AT-SPI-aware application. Disable startup
         # detection.
+        pid = subprocess.Popen(args, env=os.environ).pid
         doDelay(timeout)
-    else:
-        # Startup detection code
-        # The timing here is not totally precise, but it's good enough for now.
-        time = 0
-        while time < timeout:
-            time = time + interval
+        return pid
+
+    # Listen from before the application is started, so that nothing is missed
+    # (events are only dispatched once we wait, by which time the filter knows
+    # the pid):
+    with EventWaiter(startupEventTypes) as waiter:
+        startTime = time()
+        pid = subprocess.Popen(args, env=os.environ).pid
+        waiter.filter = lambda event: \
+            startupEventApplication(event, pid, appName) is not None
+        deadline = startTime + timeout
+        lastScan = None
+        while True:
+            app = None
+            event = waiter.lastEvent
+            waiter.lastEvent = None
+            if event is not None:
+                # Check the application the event is about:
+                app = startupEventApplication(event, pid, appName)
+                if not isStartedApplication(app, pid, appName):
+                    app = None
+            if app is None and \
+                    (lastScan is None or time() - lastScan >= interval):
+                lastScan = time()
+                app = findStartedApplication(desktop, appName, pid)
+            if app is not None:
+                startupTimes[pid] = time() - startTime
+                logger.log("%s (pid %d) created its first window after %.3fs" %
+                           (appName, pid, startupTimes[pid]))
+                from procedural import focus
+                focus.application.node = app
+                return pid
+            remaining = deadline - time()
+            if remaining <= 0:
+                break
+            waiter.wait(min(lastScan + interval - time(), remaining))
+    return pid
+
+
+def isApplication(app, pid, appName):
+    """
+    Is the application the one started as pid, or failing that (e.g. for
+    applications started by wrapper scripts), is it named appName?
+    """
+    try:
+        if app.get_process_id() == pid:
+            return True
+    except Exception:
+        pass
+    try:
+        return app.name == appName
+    except Exception:
+        return False
+
+
+def startupEventApplication(event, pid, appName):
+    """
+    Get the application one of the startupEventTypes events is about, if it
+    is the one started as pid (or named appName), or None.
+    """
+    apps = [event.host_application]
+    if event.type.startswith('object:children-changed'):
+        # An application being added to the desktop:
+        apps.append(event.any_data)
+    for app in apps:
+        if app is not None and isApplication(app, pid, appName):
+            return app
+    return None
+
+
+def isStartedApplication(app, pid, appName):
+    """
+    Is the application the one started as pid (or, failing that, named
+    appName), and is it done starting up: has it created a window? The
+    window needn't be showing, since the application may have started
+    minimized, or on another workspace.
+    """
+    try:
+        if not isApplication(app, pid, appName):
+            return False
+        for child in app.iterChildren():
+            if child.roleName == 'frame':
+                return True
+    except Exception:  # pragma: no cover
+        pass
+    return False
+
+
+def findStartedApplication(desktop, appName, pid=None):
+    """
+    Get the application started as pid, or the most recently started one
+    with the given name, if it has created a window (and so is done starting
+    up), or None.
+    """
+    try:
+        apps = desktop.children[::-1]
+    except AttributeError:  # pragma: no cover
+        return None
+    if pid is not None:
+        for app in apps:
             try:
-                for child in desktop.children[::-1]:
-                    if child.name == appName:
-                        for grandchild in child.children:
-                            if grandchild.roleName == 'frame':
-                                from procedural import focus
-                                focus.application.node = child
-                                doDelay(interval)
-                                return pid
-            except AttributeError:  # pragma: no cover
+                if app.get_process_id() == pid:
+                    if isStartedApplication(app, pid, appName):
+                        return app
+                    return None
+            except Exception:
                 pass
-            doDelay(interval)
-    return pid
+    for app in apps:
+        if app.name == appName and isStartedApplication(app, pid, appName):
+            return app
+    return None
 
 
 def doDelay(delay=None):
@@ -163,6 +270,66 @@ class Highlight (Gtk.Window):  # pragma: no cover
         cr.stroke()
 
 
+class Backoff(object):
+
+    """
+    The delays between attempts at something that is retried until a
+    deadline, growing exponentially from initial by factor up to maximum, and
+    each randomly stretched or shrunk by up to the fraction jitter so that
+    clients retrying in step drift apart. No delay goes past the deadline,
+    timeout seconds from now.
+
+    The arguments default to config.searchTimeout,
+    config.searchBackoffInitial, config.searchBackoffFactor,
+    config.searchBackoffDuration and config.searchBackoffJitter.
+    """
+
+    def __init__(self, timeout=None, initial=None, factor=None, maximum=None,
+                 jitter=None):
+        if timeout is None:
+            timeout = config.searchTimeout
+        if timeout is None:
+            timeout = config.searchCutoffCount * config.searchBackoffDuration
+        self.start = time()
+        self.deadline = self.start + timeout
+        self.delay = config.searchBackoffInitial if initial is None else initial
+        self.factor = config.searchBackoffFactor if factor is None else factor
+        self.maximum = config.searchBackoffDuration if maximum is None else maximum
+        self.jitter = config.searchBackoffJitter if jitter is None else jitter
+
+    def elapsed(self):
+        """
+        Get the number of seconds since the first attempt.
+        """
+        return time() - self.start
+
+    def warningDue(self):
+        """
+        Has the thing being retried been failing for long enough to warn
+        about it: config.searchWarningThreshold times
+        config.searchBackoffDuration seconds?
+        """
+        return self.elapsed() >= \
+            config.searchWarningThreshold * config.searchBackoffDuration
+
+    def remaining(self):
+        """
+        Get the number of seconds left until the deadline.
+        """
+        return max(0, self.deadline - time())
+
+    def next(self):
+        """
+        Get the number of seconds to wait before the next attempt; this is
+        0 once the deadline has passed.
+        """
+        delay = min(self.delay, self.maximum)
+        self.delay = delay * self.factor
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        return min(delay, self.remaining())
+
+
 class Blinker(object):  # pragma: no cover
     INTERVAL_MS = 1000
     main_loop = GObject.MainLoop()
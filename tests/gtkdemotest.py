@@ -5,10 +5,15 @@ import unittest
 class GtkDemoTest(unittest.TestCase):
     """
     TestCase subclass which handles bringing up and shutting down gtk-demo as a fixture.  Used for writing other test cases.
+    The config options named in configOptions are restored after each test.
     """
 
+    configOptions = ()
+
     def setUp(self):
         import dogtail.config
+        self.savedConfig = dict((name, getattr(dogtail.config.config, name))
+                                for name in self.configOptions)
         dogtail.config.config.logDebugToStdOut = True
         dogtail.config.config.logDebugToFile = False
         import dogtail.utils
@@ -19,6 +24,9 @@ class GtkDemoTest(unittest.TestCase):
         import os
         import signal
         import time
+        import dogtail.config
+        for (name, value) in self.savedConfig.items():
+            setattr(dogtail.config.config, name, value)
         os.kill(self.pid, signal.SIGKILL)
         # Sleep just enough to let the app actually die.
         # AT-SPI doesn't like being hammered too fast.
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the dogtail.aio module
+"""
+import dogtail.tree
+import dogtail.predicate
+import dogtail.aio
+dogtail.config.config.logDebugToFile = False
+from dogtail.aio import coroutine, Return, runUntilComplete
+from gtkdemotest import GtkDemoTest
+
+
+class TestAio(GtkDemoTest):
+
+    configOptions = ('searchTimeout',)
+
+    def test_coroutines(self):
+        @coroutine
+        def delayedSum(a, b):
+            yield dogtail.aio.sleep(0.01)
+            result = yield dogtail.aio.runInExecutor(lambda: a + b)
+            raise Return(result)
+
+        @coroutine
+        def failing():
+            yield dogtail.aio.sleep(0)
+            raise ValueError("failed")
+
+        self.assertEquals(runUntilComplete([delayedSum(1, 2), delayedSum(3, 4)]),
+                          [3, 7])
+        self.assertRaises(ValueError, runUntilComplete, failing())
+
+    def test_find_child(self):
+        pred = dogtail.predicate.GenericPredicate(roleName='page tab')
+        self.assertEquals(
+            runUntilComplete(dogtail.aio.findChild(self.app, pred)),
+            self.app.findChild(pred))
+        self.assertEquals(
+            runUntilComplete(dogtail.aio.findChildren(self.app, pred)),
+            self.app.findChildren(pred))
+
+    def test_find_child_fails(self):
+        dogtail.config.config.searchTimeout = 1
+        self.assertRaises(
+            dogtail.tree.SearchError, runUntilComplete,
+            dogtail.aio.child(self.app, 'this does not exist'))
+        self.assertEquals(runUntilComplete(dogtail.aio.findChild(
+            self.app, dogtail.predicate.IsNamed('this does not exist'),
+            requireResult=False)), None)
+
+    def test_searches_run_concurrently(self):
+        searches = [dogtail.aio.child(self.app, roleName=roleName)
+                    for roleName in ('page tab', 'tree table', 'frame')]
+        results = runUntilComplete(searches)
+        self.assertEquals([result.roleName for result in results],
+                          ['page tab', 'tree table', 'frame'])
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the dogtail.mirror module
+"""
+import dogtail.tree
+import dogtail.predicate
+import dogtail.mirror
+dogtail.config.config.logDebugToFile = False
+from gtkdemotest import GtkDemoTest
+
+
+class TestTreeMirror(GtkDemoTest):
+
+    def setUp(self):
+        GtkDemoTest.setUp(self)
+        self.mirror = dogtail.mirror.TreeMirror(self.app)
+
+    def tearDown(self):
+        self.mirror.stop()
+        GtkDemoTest.tearDown(self)
+
+    def test_mirror_contains_app(self):
+        self.assertFalse(self.app in self.mirror)
+        self.mirror.start()
+        self.assertTrue(self.app in self.mirror)
+        self.assertTrue(self.app.children[0] in self.mirror)
+        self.assertEquals(dogtail.mirror.mirrorFor(self.app), self.mirror)
+        self.mirror.stop()
+        self.assertEquals(dogtail.mirror.mirrorFor(self.app), None)
+
+    def test_find_children_from_mirror(self):
+        pred = dogtail.predicate.GenericPredicate(roleName='page tab')
+        live = self.app.findChildren(pred)
+        self.mirror.start()
+        self.assertEquals(self.app.findChildren(pred), live)
+        self.assertEquals(self.app.findChildren(pred, strategy='bfs', maxDepth=2),
+                          [])
+
+    def test_find_ancestor_from_mirror(self):
+        self.mirror.start()
+        tab = self.app.child(roleName='page tab')
+        self.assertEquals(
+            tab.findAncestor(dogtail.predicate.IsAWindow()), self.app.children[0])
+
+    def test_mirror_follows_new_windows(self):
+        self.mirror.start()
+        self.runDemo('Dialog and Message Boxes')
+        wnd = self.app.window('Dialogs')
+        self.assertTrue(wnd in self.mirror)
+
+    def test_indexed_lookup(self):
+        pred = dogtail.predicate.GenericPredicate(roleName='page tab',
+                                                  name='Info')
+        live = self.app.findChildren(pred)
+        self.mirror.start()
+        entries = self.mirror.lookup(self.app, pred)
+        self.assertEquals([entry.node for entry in entries], live)
+        self.assertEquals(self.app.findChildren(pred), live)
+        self.assertEquals(
+            [entry.node for entry in self.mirror.lookup(
+                self.app, dogtail.predicate.IsAWindow())],
+            [self.app.children[0]])
+        self.assertEquals(
+            self.mirror.lookup(self.app, dogtail.predicate.IsNotShowing()), None)
+
+    def test_search_root_is_not_a_descendant(self):
+        window = self.app.children[0]
+        pred = dogtail.predicate.IsAWindowNamed(window.name)
+        self.mirror.start()
+        self.assertEquals(self.mirror.lookup(window, pred), [])
+        self.assertEquals(window.findChildren(pred), [])
+        self.assertEquals(window.findChild(pred, retry=False,
+                                           requireResult=False), None)
+
+    def test_custom_predicate_gets_nodes(self):
+        class IsATabNode(dogtail.predicate.Predicate):
+
+            def satisfiedByNode(self, node):
+                return isinstance(node, dogtail.tree.Node) and \
+                    node.roleName == 'page tab'
+
+            def describeSearchResult(self):
+                return 'page tab node'
+        live = self.app.findChildren(IsATabNode())
+        self.assertTrue(live)
+        self.mirror.start()
+        self.assertEquals(self.app.findChildren(IsATabNode()), live)
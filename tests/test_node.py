@@ -16,11 +16,15 @@ test method is run.
 __author__ = "Dave Malcolm <dmalcolm@redhat.com>"
 
 import unittest
+import time
 import dogtail.tree
 import dogtail.predicate
+import dogtail.path
 import dogtail.config
+import dogtail.events
 dogtail.config.config.logDebugToFile = False
 import pyatspi
+from gi.repository import GLib
 from nose.tools import nottest
 from gtkdemotest import GtkDemoTest, trap_stdout
 
@@ -31,6 +35,8 @@ class TestNodeAttributes(GtkDemoTest):
     Unit tests for the the various synthesized attributes of a Node
     """
 
+    configOptions = ('cacheLiveness',)
+
     def testGetBogus(self):
         "Getting a non-existant attribute should raise an attribute error"
         self.assertRaises(
@@ -111,6 +117,93 @@ class TestNodeAttributes(GtkDemoTest):
         self.assertRaises(
             AttributeError, self.app.__setattr__, "children", [])
 
+    def testDead(self):
+        "Node.dead should be False for live nodes, and become True when closed"
+        self.assertFalse(self.app.dead)
+        self.runDemo('Dialog and Message Boxes')
+        wnd = self.app.window('Dialogs')
+        wnd.button('Interactive Dialog').click()
+        dlg = self.app.dialog('Interactive Dialog')
+        dogtail.config.config.cacheLiveness = True
+        self.assertFalse(dlg.dead)
+        self.assertFalse(dlg.dead)
+        dlg.button('Cancel').click()
+        self.assertTrue(dlg.waitUntilGone(timeout=5))
+        # Turning the cache off stops it listening for events:
+        self.assertTrue(dogtail.events.livenessCache.waiter.registered)
+        dogtail.config.config.cacheLiveness = False
+        self.assertFalse(dogtail.events.livenessCache.waiter.registered)
+
+    def testWaitForDialog(self):
+        "Application.waitForDialog should return the dialog once it opens"
+        self.runDemo('Dialog and Message Boxes')
+        wnd = self.app.waitForWindow('Dialogs')
+        self.assertEquals(wnd.roleName, 'frame')
+        wnd.button('Interactive Dialog').click()
+        dlg = self.app.waitForDialog('Interactive Dialog', timeout=5)
+        self.assertEquals(dlg.name, 'Interactive Dialog')
+        self.assertEquals(
+            self.app.waitForDialog('thisIsNotADialog', timeout=0.5,
+                                   requireResult=False), None)
+        self.assertRaises(dogtail.tree.SearchError, self.app.waitForWindow,
+                          'thisIsNotAWindow', timeout=0.5)
+
+    def testIterChildren(self):
+        "Node.iterChildren should generate the same children, in pages or not"
+        tree = self.app.child(roleName='tree table')
+        children = tree.children
+        self.assertEquals(list(tree.iterChildren()), children)
+        self.assertEquals(list(tree.iterChildren(pageSize=3)), children)
+        self.assertEquals(next(tree.iterChildren()), children[0])
+
+    def testAbsoluteSearchPath(self):
+        "Node.getAbsoluteSearchPath should give a path that finds the node again"
+        tree = self.app.child(roleName='tree table')
+        searchPath = tree.getAbsoluteSearchPath()
+        node = dogtail.tree.root
+        for (pred, isRecursive) in searchPath:
+            node = node.findChild(pred, recursive=isRecursive)
+        self.assertEquals(node, tree)
+        # The path is remembered, but changing a copy doesn't change it:
+        searchPath.append(dogtail.predicate.IsNamed('foo'), False)
+        self.assertEquals(tree.getAbsoluteSearchPath().length(),
+                          searchPath.length() - 1)
+        # Only the application's events are listened for, until the paths
+        # are dropped:
+        (paths, waiter) = \
+            dogtail.tree.searchPathCache.applicationPaths.entries[self.app]
+        self.assertTrue(tree in paths)
+        self.assertTrue(waiter.filter is not None)
+        dogtail.tree.searchPathCache.clear()
+        self.assertFalse(waiter.registered)
+
+    def testLocator(self):
+        "A Locator should find its node again, reusing what it found before"
+        tree = self.app.child(roleName='tree table')
+        locator = dogtail.path.Locator.forNode(tree)
+        self.assertEquals(locator.resolve(), tree)
+        nodes = list(locator.nodes)
+        self.assertEquals(locator.resolve(), tree)
+        self.assertEquals(locator.nodes, nodes)
+        restored = dogtail.path.Locator.fromJSON(locator.toJSON())
+        self.assertEquals(restored.resolve(), tree)
+        plan = dogtail.path.compilePlan(locator.toText())
+        self.assertEquals(plan.resolve(), tree)
+
+    def testTable(self):
+        "Node.table should give access to the cells of the demo list by row"
+        tree = self.app.child(roleName='tree table')
+        table = tree.table
+        self.assertTrue(table.rowCount > 0)
+        self.assertEquals(table.cellAt(0, 0).roleName, 'table cell')
+        rows = list(table.rows(pageSize=5))
+        self.assertEquals(len(rows), table.rowCount)
+        name = table.cellAt(2, 0).name
+        row = table.findRow(dogtail.predicate.IsNamed(name), column=0)
+        self.assertEquals(row.index, 2)
+        self.assertEquals(table.positionOf(row[0]), (2, 0))
+        self.assertEquals(self.app.table, None)
+
     # 'text' (string):
     @nottest
     def testSimpleTextEntry(self):
@@ -154,6 +247,25 @@ class TestNodeAttributes(GtkDemoTest):
         # FIXME: should have a test case involving the complex GtkTextView
         # widget
 
+    def testTypeTextInserting(self):
+        """
+        Node.typeText should insert text at the caret in one go when asked to
+        """
+        self.runDemo('Dialog and Message Boxes')
+        wnd = self.app.window('Dialogs')
+        wnd.button('Interactive Dialog').click()
+        dlg = self.app.dialog('Interactive Dialog')
+        entry1 = dlg.child(label='Entry 1')
+        entry1.text = "hello"
+        entry1.caretOffset = 5
+        longText = " world" * 1000
+        start = time.time()
+        entry1.typeText(longText, method='insert')
+        self.assertTrue(time.time() - start < len(longText) *
+                        dogtail.config.config.typingDelay)
+        self.assertEquals(entry1.text, "hello" + longText)
+        self.assertEquals(entry1.caretOffset, len("hello" + longText))
+
     @nottest
     def testCaretOffset(self):
         "Make sure the caret offset works as expected"
@@ -342,6 +454,8 @@ class TestNodeAttributes(GtkDemoTest):
 
 class TestSelection(GtkDemoTest):
 
+    configOptions = ('settleAfterActions',)
+
     def testTabs(self):
         """
         Tabs in the gtk-demo should be selectable, and be queryable for
@@ -369,6 +483,20 @@ class TestSelection(GtkDemoTest):
         # self.assert_(info.isSelected)
         #self.assert_(not source.isSelected)
 
+    def testTabsSettling(self):
+        """
+        Selecting a tab with settleAfterActions should not take the whole
+        delay, and should still leave the tab selected.
+        """
+        info = self.app.child('Info')
+        source = self.app.child('Source')
+        dogtail.config.config.settleAfterActions = True
+        start = time.time()
+        source.select()
+        self.assert_(time.time() - start < dogtail.config.config.defaultDelay)
+        self.assert_(source.isSelected)
+        self.assert_(not info.isSelected)
+
 
 class TestValue(GtkDemoTest):
 
@@ -400,6 +528,11 @@ class TestValue(GtkDemoTest):
 
 
 class TestSearching(GtkDemoTest):
+
+    configOptions = ('searchWaitForEvents', 'searchBackoffInitial',
+                     'searchBackoffDuration', 'searchUseCollection',
+                     'searchUseLabelIndex')
+
     # FIXME: should test the various predicates and the search methods of Node
 
     def testFindChildren(self):
@@ -448,6 +581,140 @@ class TestSearching(GtkDemoTest):
         self.assertEquals(texts2[1].roleName, 'text')
         self.assertTrue(texts2[1].showing)
 
+    def testFindChildrenBreadthFirst(self):
+        "Both strategies should find the same nodes, shallowest first for BFS"
+        pred = dogtail.predicate.GenericPredicate(roleName='page tab')
+        dfs = self.app.findChildren(pred, strategy='dfs')
+        bfs = self.app.findChildren(pred, strategy='bfs')
+        self.assertEquals(sorted(dfs), sorted(bfs))
+
+        def depth(node):
+            result = 0
+            while node != self.app:
+                node = node.parent
+                result += 1
+            return result
+        depths = [depth(node) for node in bfs]
+        self.assertEquals(depths, sorted(depths))
+
+    def testFindChildMaxDepth(self):
+        "A depth-limited search should not find deeper nodes"
+        self.assertEquals(self.app.findChild(
+            dogtail.predicate.IsAWindow(), maxDepth=1).roleName, 'frame')
+        self.assertEquals(self.app.findChildren(
+            dogtail.predicate.GenericPredicate(roleName='frame'), maxDepth=1),
+            self.app.children)
+        self.assertRaises(dogtail.tree.SearchError, self.app.child,
+                          roleName='page tab', retry=False, maxDepth=2)
+        self.assertEquals(self.app.child(
+            roleName='page tab', strategy='bfs').roleName, 'page tab')
+
+    def testFindChildrenPruned(self):
+        "Pruned searches should not descend into the pruned subtrees"
+        pred = dogtail.predicate.GenericPredicate(roleName='table cell')
+        self.assertTrue(self.app.findChildren(pred))
+        self.assertEquals(
+            self.app.findChildren(pred, prune=dogtail.predicate.IsATable()), [])
+        tables = self.app.findChildren(dogtail.predicate.IsATable(),
+                                       prune=dogtail.predicate.IsATable())
+        self.assertTrue(tables)
+        showing = self.app.findChildren(
+            dogtail.predicate.GenericPredicate(),
+            prune=[dogtail.predicate.IsNotShowing(), dogtail.predicate.IsATable()])
+        self.assertTrue(len(showing) < len(self.app.findChildren(
+            dogtail.predicate.GenericPredicate())))
+
+    def testFindChildrenInParallel(self):
+        "Parallel searches should find the same nodes, in the same order"
+        pred = dogtail.predicate.GenericPredicate(name='Info')
+        for strategy in ('dfs', 'bfs'):
+            serial = self.app.findChildren(pred, strategy=strategy)
+            self.assertEquals(self.app.findChildren(
+                pred, strategy=strategy, threads=4), serial)
+        self.assertEquals(self.app.findChild(pred, threads=4),
+                          self.app.findChild(pred))
+
+    def testFindChildrenWithoutCollection(self):
+        "Role-filtered searches should give the same results either way"
+        pred = dogtail.predicate.GenericPredicate(roleName='table cell')
+        tableCells = self.app.findChildren(pred)
+        dogtail.config.config.searchUseCollection = False
+        self.assertEquals(self.app.findChildren(pred), tableCells)
+
+    def testFindChildCustomPredicate(self):
+        "Custom predicates and prune functions should be handed Nodes"
+        class IsATableCellNode(dogtail.predicate.Predicate):
+
+            def satisfiedByNode(self, node):
+                return isinstance(node, dogtail.tree.Node) and \
+                    node.roleName == 'table cell'
+
+            def describeSearchResult(self):
+                return 'table cell node'
+
+        def pruneNonNodes(node):
+            return not isinstance(node, dogtail.tree.Node)
+        cell = self.app.findChild(IsATableCellNode(), prune=pruneNonNodes)
+        self.assertEquals(cell.roleName, 'table cell')
+        self.assertEquals(len(self.app.findChildren(IsATableCellNode())),
+                          len(self.app.findChildren(
+                              dogtail.predicate.GenericPredicate(
+                                  roleName='table cell'))))
+
+    def testFindChildrenByLabelWithoutIndex(self):
+        "Searches by label should give the same results with or without the label index"
+        self.runDemo('Dialog and Message Boxes')
+        wnd = self.app.window('Dialogs')
+        pred = dogtail.predicate.IsLabelledAs('Entry 1')
+        entries = wnd.findChildren(pred)
+        self.assertEquals(len(entries), 1)
+        self.assertEquals(wnd.child(label='Entry 1'), entries[0])
+        dogtail.config.config.searchUseLabelIndex = False
+        self.assertEquals(wnd.findChildren(pred), entries)
+        self.assertEquals(wnd.child(label='Entry 1'), entries[0])
+
+    def testLabelIndexDeregisters(self):
+        "The label index should only listen while it keeps an index"
+        self.runDemo('Dialog and Message Boxes')
+        wnd = self.app.window('Dialogs')
+        wnd.child(label='Entry 1')
+        (index, waiter) = dogtail.tree.labelIndex.indexes.entries[wnd]
+        self.assertTrue(waiter.registered)
+        self.assertTrue(waiter.filter is not None)
+        dogtail.tree.labelIndex.clear()
+        self.assertFalse(waiter.registered)
+
+    def testFindChildTimeout(self):
+        "A failing search should give up at its deadline"
+        start = time.time()
+        self.assertRaises(dogtail.tree.SearchError, self.app.child,
+                          'thisIsNotAChild', timeout=1)
+        self.assertTrue(1 <= time.time() - start < 5)
+
+    def testFindChildWaitingForEvents(self):
+        "A search for a window that is still opening should wake up on events"
+        demo = self.app.child(roleName='tree table').child(
+            'Dialog and Message Boxes')
+
+        def openDemo():
+            action = demo.queryAction()
+            for i in range(action.nActions):
+                if action.getName(i) == 'activate':
+                    action.doAction(i)
+            return False
+        # Only poll every 5 seconds, so that finding the window sooner than
+        # that means that an event woke the search up:
+        dogtail.config.config.searchWaitForEvents = True
+        dogtail.config.config.searchBackoffInitial = 5.0
+        dogtail.config.config.searchBackoffDuration = 5.0
+        # The demo is opened from the main loop the search waits in:
+        GLib.timeout_add(200, openDemo)
+        start = time.time()
+        wnd = self.app.child('Dialogs', roleName='frame', recursive=False,
+                             timeout=10)
+        self.assertEquals(wnd.roleName, 'frame')
+        self.assertTrue(time.time() - start < 4)
+
     # def testFindChildrenNonRecursive(self):
     #     """
     #     Ensure that there are the correct number of table cells in the Tree
@@ -471,6 +738,42 @@ class TestSearching(GtkDemoTest):
     #     self.assertEquals(len(cells), len(direct_cells))
 
 
+class TestNodeSnapshot(unittest.TestCase):
+
+    class CountingNode(object):
+
+        def __init__(self):
+            self.fetches = 0
+
+        @property
+        def name(self):
+            self.fetches += 1
+            return 'dummy'
+
+        roleName = 'push button'
+
+    def testPropertiesFetchedOnce(self):
+        node = self.CountingNode()
+        searchPass = dogtail.tree.SearchPass()
+        snapshot = searchPass.snapshot(node)
+        self.assertEquals(snapshot.name, 'dummy')
+        self.assertEquals(snapshot.name, 'dummy')
+        self.assertEquals(searchPass.snapshot(node).name, 'dummy')
+        self.assertEquals(node.fetches, 1)
+        self.assertEquals(snapshot.roleName, 'push button')
+
+    def testPredicateSeesSnapshot(self):
+        node = self.CountingNode()
+        pred = dogtail.predicate.IsAButtonNamed('dummy')
+        satisfied = dogtail.tree.SearchPass().wrap(pred.satisfiedByNode)
+        self.assertTrue(satisfied(node))
+        self.assertEquals(node.fetches, 1)
+
+    def testSnapshotIsReadOnly(self):
+        snapshot = dogtail.tree.SearchPass().snapshot(self.CountingNode())
+        self.assertRaises(AttributeError, setattr, snapshot, 'name', 'x')
+
+
 class TestActions(GtkDemoTest):
     # FIXME: should test the various actions
     pass
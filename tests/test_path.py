@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the dogtail.path package
+"""
+import unittest
+import dogtail.tree
+import dogtail.predicate
+import dogtail.path
+
+
+class TestSearchPath(unittest.TestCase):
+
+    text = '/IsAnApplicationNamed(appName="gtk3-demo")' \
+        '//GenericPredicate(name="Entry 1", roleName="text")' \
+        '/IsAWindow/IsAButtonNamed(buttonName="OK")' \
+        '//IsLabelledAs(labelText="Name:")'
+
+    def test_text_round_trip(self):
+        searchPath = dogtail.path.SearchPath.fromText(self.text)
+        self.assertEquals(searchPath.length(), 5)
+        self.assertEquals(searchPath.toText(), self.text)
+        self.assertEquals([isRecursive for (pred, isRecursive) in searchPath],
+                          [False, True, False, False, True])
+        pred = searchPath.getPredicate(1)
+        self.assertEquals(pred.name.untranslatedString, 'Entry 1')
+        self.assertEquals(pred.roleName, 'text')
+        self.assertEquals(pred.description, None)
+        spaced = dogtail.path.SearchPath.fromText(
+            ' / IsAnApplicationNamed ( appName = "gtk3-demo" ) // IsAWindow() ')
+        self.assertEquals(spaced.toText(),
+                          '/IsAnApplicationNamed(appName="gtk3-demo")//IsAWindow')
+        self.assertEquals(dogtail.path.SearchPath.fromText('').length(), 0)
+
+    def test_invalid_text(self):
+        for text in ('IsAWindow', '/IsAWindow(', '/IsNamed(name="x"',
+                     '/IsNamed(name=x)', '/IsNamed(nam="x")', '/NoSuchPredicate',
+                     '/IsAWindow extra'):
+            self.assertRaises(ValueError, dogtail.path.SearchPath.fromText, text)
+
+    def test_plan(self):
+        plan = dogtail.path.compilePlan(self.text)
+        self.assertEquals([(len(predicates), isRecursive, strategy)
+                           for (predicates, isRecursive, strategy) in plan.steps],
+                          [(1, False, None), (1, True, 'dfs'),
+                           (2, False, None), (1, True, 'dfs')])
+        self.assertTrue(dogtail.path.compilePlan(self.text) is plan)
+        plan = dogtail.path.compilePlan(
+            '//IsADialogNamed(dialogName="About")//IsNamed(name="x")')
+        self.assertEquals([strategy for (predicates, isRecursive, strategy)
+                           in plan.steps], ['bfs', None])
@@ -190,3 +190,153 @@ class TestPredicate(unittest.TestCase):
             False), u'dialog("dummy name 1")')
         self.assertEquals(
             genericNamedPredicate.makeScriptVariableName(), u'dummyName1Dlg')
+
+    def test_predicates_name_regex(self):
+        dummyButton = self.DummyNode('Save As...', 'push button')
+        self.assertTrue(dogtail.predicate.IsAButtonNamed(
+            'Save.*').satisfiedByNode(dummyButton))
+        self.assertTrue(dogtail.predicate.IsAButtonNamed(
+            'Save As...').satisfiedByNode(dummyButton))
+        self.assertFalse(dogtail.predicate.IsAButtonNamed(
+            'Save').satisfiedByNode(dummyButton))
+
+    def test_predicates_name_parentheses(self):
+        dummyTab = self.DummyNode('Untitled (1)', 'page tab')
+        self.assertTrue(dogtail.predicate.IsATabNamed(
+            'Untitled (1)').satisfiedByNode(dummyTab))
+        self.assertTrue(dogtail.predicate.IsATabNamed(
+            'Untitled (.*)').satisfiedByNode(dummyTab))
+        self.assertFalse(dogtail.predicate.IsATabNamed(
+            'Untitled').satisfiedByNode(dummyTab))
+
+    def test_predicates_name_leading_asterisk(self):
+        dummyLabel = self.DummyNode('*Unsaved Document 1', 'label')
+        self.assertTrue(dogtail.predicate.IsNamed(
+            '*Unsaved Document 1').satisfiedByNode(dummyLabel))
+        self.assertFalse(dogtail.predicate.IsNamed(
+            '*Unsaved').satisfiedByNode(self.DummyNode('Unsaved', 'label')))
+
+    def test_predicates_name_invalid_regex(self):
+        dummyLabel = self.DummyNode('[foo', 'label')
+        self.assertTrue(dogtail.predicate.IsNamed(
+            '[foo').satisfiedByNode(dummyLabel))
+
+    def test_predicates_required_roles(self):
+        self.assertEquals(dogtail.predicate.IsAButtonNamed(
+            'dummy').requiredRoleNames, ('push button',))
+        self.assertTrue('check menu item' in dogtail.predicate.IsAMenuItemNamed(
+            'dummy').requiredRoleNames)
+        self.assertEquals(dogtail.predicate.GenericPredicate(
+            roleName='label').requiredRoleNames, ('label',))
+        self.assertEquals(dogtail.predicate.GenericPredicate(
+            name='dummy').requiredRoleNames, None)
+        # Roles are ignored when searching by label:
+        self.assertEquals(dogtail.predicate.GenericPredicate(
+            label='dummy', roleName='text').requiredRoleNames, None)
+        self.assertEquals(dogtail.predicate.IsNamed(
+            'dummy').requiredRoleNames, None)
+
+    def test_predicates_required_name(self):
+        pred = dogtail.predicate.IsAButtonNamed('OK')
+        self.assertEquals(pred.requiredName.untranslatedString, 'OK')
+        self.assertTrue(pred.requiredName.isLiteral)
+        self.assertEquals(pred.requiredLabel, None)
+        self.assertFalse(
+            dogtail.predicate.IsNamed('dum*y').requiredName.isLiteral)
+        pred = dogtail.predicate.GenericPredicate(label='Name:')
+        self.assertEquals(pred.requiredName, None)
+        self.assertEquals(pred.requiredLabel.untranslatedString, 'Name:')
+        self.assertEquals(
+            dogtail.predicate.IsAWindow().requiredName, None)
+
+    def test_predicates_pruners(self):
+        dummyTable = self.DummyNode('', 'tree table')
+        self.assertTrue(dogtail.predicate.IsATable().satisfiedByNode(dummyTable))
+        self.assertFalse(dogtail.predicate.IsATable().satisfiedByNode(
+            self.DummyNode('', 'panel')))
+        dummyTable.showing = False
+        self.assertTrue(
+            dogtail.predicate.IsNotShowing().satisfiedByNode(dummyTable))
+
+    def test_predicates_saved(self):
+        import json
+        import dogtail.path
+        for pred in (dogtail.predicate.IsAnApplicationNamed('gtk3-demo'),
+                     dogtail.predicate.GenericPredicate(name='OK',
+                                                        roleName='push button'),
+                     dogtail.predicate.IsLabelledAs('Name:'),
+                     dogtail.predicate.IsAWindow()):
+            saved = json.loads(json.dumps(pred.toDict()))
+            restored = dogtail.predicate.fromDict(saved)
+            self.assertEquals(type(restored), type(pred))
+            self.assertEquals(restored.toDict(), pred.toDict())
+            self.assertEquals(restored.describeSearchResult(),
+                              pred.describeSearchResult())
+        self.assertRaises(TypeError, dogtail.predicate.IsLabelledBy().toDict)
+        self.assertRaises(ValueError, dogtail.predicate.fromDict,
+                          {'type': 'stringMatches', 'fields': {}})
+
+        searchPath = dogtail.path.SearchPath()
+        searchPath.append(dogtail.predicate.IsAnApplicationNamed('gtk3-demo'),
+                          False)
+        searchPath.append(dogtail.predicate.IsAButtonNamed('Run'), True)
+        restored = dogtail.path.SearchPath.fromList(
+            json.loads(json.dumps(searchPath.toList())))
+        self.assertEquals(restored.toList(), searchPath.toList())
+        self.assertEquals(str(restored), str(searchPath))
+
+    def test_predicates_combined(self):
+        okButton = self.DummyNode('OK', 'push button', 'Accept')
+        okLabel = self.DummyNode('OK', 'label')
+        isOK = dogtail.predicate.IsNamed('OK')
+        isAButton = dogtail.predicate.HasRole(['push button', 'toggle button'])
+        both = dogtail.predicate.And(isOK, isAButton)
+        self.assertTrue(both.satisfiedByNode(okButton))
+        self.assertFalse(both.satisfiedByNode(okLabel))
+        either = dogtail.predicate.Or(isAButton,
+                                      dogtail.predicate.HasRole('label'))
+        self.assertTrue(either.satisfiedByNode(okLabel))
+        self.assertEquals(either.requiredRoleNames,
+                          ('push button', 'toggle button', 'label'))
+        self.assertEquals(dogtail.predicate.Or(isOK, isAButton).requiredRoleNames,
+                          None)
+        notAButton = dogtail.predicate.Not(isAButton)
+        self.assertTrue(notAButton.satisfiedByNode(okLabel))
+        self.assertEquals(both.requiredRoleNames, isAButton.roleNames)
+        self.assertEquals(both.requiredName, isOK.name)
+        self.assertTrue(dogtail.predicate.HasDescription(
+            'Accept').satisfiedByNode(okButton))
+        self.assertEquals(both.describeSearchResult(),
+                          "(named %s and with role 'push button' or "
+                          "'toggle button')" % isOK.name)
+        self.assertEquals(notAButton.makeScriptMethodCall(True),
+                          "findChild(predicate.Not(predicate.HasRole("
+                          "roleNames=['push button', 'toggle button'])))")
+        restored = dogtail.predicate.fromDict(
+            dogtail.predicate.And(notAButton, isOK).toDict())
+        self.assertEquals(restored.describeSearchResult(),
+                          "(not with role 'push button' or 'toggle button' "
+                          "and named %s)" % isOK.name)
+
+    def test_predicates_cheapest_first(self):
+        checked = []
+
+        class Checked(dogtail.predicate.Predicate):
+
+            def __init__(self, name, cost, result):
+                self.cost = cost
+
+                def satisfiedByNode(node):
+                    checked.append(name)
+                    return result
+                self.satisfiedByNode = satisfiedByNode
+
+        expensive = Checked('expensive', 4.0, False)
+        cheap = Checked('cheap', 1.0, False)
+        self.assertFalse(dogtail.predicate.And(
+            expensive, cheap).satisfiedByNode(None))
+        self.assertEquals(checked, ['cheap'])
+        self.assertTrue(dogtail.predicate.IsLabelledAs('x').cost >
+                        dogtail.predicate.IsAButtonNamed('x').cost)
+        self.assertTrue(dogtail.predicate.IsNamed('x*').cost >
+                        dogtail.predicate.IsNamed('x').cost)
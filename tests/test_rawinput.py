@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the dogtail.rawinput module
+"""
+import unittest
+import dogtail.config
+import dogtail.rawinput as rawinput
+
+
+class TestTypeText(unittest.TestCase):
+
+    """
+    Records the keys typeText() generates, and the typing delays between
+    them, instead of typing anything.
+    """
+
+    def setUp(self):
+        self.typed = []
+        self.generateKey = rawinput.generateKey
+        self.doTypingDelay = rawinput.doTypingDelay
+        self.typingBatchSize = dogtail.config.config.typingBatchSize
+        rawinput.generateKey = self.typed.append
+        rawinput.doTypingDelay = lambda: self.typed.append('delay')
+
+    def tearDown(self):
+        rawinput.generateKey = self.generateKey
+        rawinput.doTypingDelay = self.doTypingDelay
+        dogtail.config.config.typingBatchSize = self.typingBatchSize
+
+    def test_unbatched(self):
+        rawinput.typeText('abc')
+        self.assertEquals(self.typed, ['a', 'delay', 'b', 'delay',
+                                       'c', 'delay'])
+
+    def test_batched(self):
+        rawinput.typeText('abcde', batchSize=2)
+        self.assertEquals(self.typed, ['a', 'b', 'delay', 'c', 'd', 'delay',
+                                       'e', 'delay'])
+
+    def test_batch_size_from_config(self):
+        dogtail.config.config.typingBatchSize = 3
+        rawinput.typeText('abcd')
+        self.assertEquals(self.typed, ['a', 'b', 'c', 'delay', 'd', 'delay'])
+
+    def test_small_batch_sizes_unbatched(self):
+        for batchSize in (0, -1):
+            del self.typed[:]
+            rawinput.typeText('ab', batchSize=batchSize)
+            self.assertEquals(self.typed, ['a', 'delay', 'b', 'delay'])
+        dogtail.config.config.typingBatchSize = 0
+        del self.typed[:]
+        rawinput.typeText('ab')
+        self.assertEquals(self.typed, ['a', 'delay', 'b', 'delay'])
+
+
+class TestKeyCaches(unittest.TestCase):
+
+    def setUp(self):
+        self.lookUpKeySym = rawinput.lookUpKeySym
+        self.lookedUp = []
+
+        def lookUpKeySym(keyName):
+            self.lookedUp.append(keyName)
+            return self.lookUpKeySym(keyName)
+        rawinput.lookUpKeySym = lookUpKeySym
+        rawinput.keySyms.clear()
+
+    def tearDown(self):
+        rawinput.lookUpKeySym = self.lookUpKeySym
+
+    def test_key_syms_cached(self):
+        keySym = rawinput.keyNameToKeySym('Return')
+        self.assertEquals(keySym, rawinput.Gdk.KEY_Return)
+        self.assertEquals(rawinput.keyNameToKeySym('Return'), keySym)
+        self.assertEquals(self.lookedUp, ['Return'])
+
+    def test_key_codes_cached_until_keys_changed(self):
+        cache = rawinput.getKeymapCache()
+        self.assertTrue(rawinput.getKeymapCache() is cache)
+        cache.invalidate()
+        keyCode = rawinput.keyNameToKeyCode('Return')
+        self.assertEquals(cache.keyCodes, {'Return': keyCode})
+        # What is cached is used as is:
+        cache.keyCodes['Return'] = -1
+        self.assertEquals(rawinput.keyNameToKeyCode('Return'), -1)
+        cache.keymap.emit('keys-changed')
+        self.assertEquals(cache.keyCodes, {})
+        self.assertEquals(rawinput.keyNameToKeyCode('Return'), keyCode)
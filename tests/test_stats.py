@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the dogtail.stats module
+"""
+import dogtail.tree
+import dogtail.predicate
+import dogtail.stats
+dogtail.config.config.logDebugToFile = False
+from gtkdemotest import GtkDemoTest
+
+
+class TestStats(GtkDemoTest):
+
+    def test_search_counted(self):
+        with dogtail.stats.Stats('test') as stats:
+            self.app.child(roleName='page tab')
+            self.app.findChildren(
+                dogtail.predicate.GenericPredicate(roleName='frame'), maxDepth=1)
+        self.assertEquals(len(stats.searches), 2)
+        record = stats.searches[0]
+        self.assertTrue(record.found)
+        self.assertTrue(record.nodesVisited > 0)
+        self.assertTrue(record.callCount > 0)
+        self.assertTrue('test_stats.py' in record.caller)
+        self.assertTrue(stats.summary().startswith('Search statistics for test'))
+
+    def test_function_search_described(self):
+        def isAFrame(node):
+            return node.roleName == 'frame'
+        with dogtail.stats.Stats() as stats:
+            frames = self.app.findChildren(isAFrame, maxDepth=1)
+        self.assertTrue(len(frames) > 0)
+        self.assertTrue(stats.searches[0].description.endswith(
+            'satisfying isAFrame'))
+
+    def test_retries_counted(self):
+        with dogtail.stats.Stats() as stats:
+            self.assertFalse(self.app.isChild('thisIsNotAChild', retry=True,
+                                              timeout=0.5))
+        record = stats.searches[0]
+        self.assertFalse(record.found)
+        self.assertTrue(record.retries > 0)
+        self.assertTrue(record.sleepTime > 0)
+
+    def test_inactive(self):
+        stats = dogtail.stats.Stats()
+        self.app.child(roleName='page tab')
+        self.assertEquals(stats.searches, [])
+        self.assertEquals(dogtail.stats.originalAttributes, {})
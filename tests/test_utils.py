@@ -55,6 +55,51 @@ class TestScreenshot(GtkDemoTest):
         self.assertRaises(ValueError, dogtail.utils.screenshot, "basename.dat")
 
 
+class TestRun(GtkDemoTest):
+
+    def test_startup_detected_by_pid(self):
+        self.assertTrue(self.pid in dogtail.utils.startupTimes)
+        self.assertTrue(0 < dogtail.utils.startupTimes[self.pid] <
+                        dogtail.config.config.runTimeout)
+        self.assertEquals(self.app.get_process_id(), self.pid)
+        self.assertEquals(dogtail.utils.findStartedApplication(
+            dogtail.tree.root, 'gtk3-demo', self.pid), self.app)
+
+    def test_startup_events_from_other_applications_ignored(self):
+        class Event(object):
+
+            def __init__(self, type, host_application, any_data=None):
+                self.type = type
+                self.host_application = host_application
+                self.any_data = any_data
+        desktop = dogtail.tree.root
+        ours = Event('window:create', self.app)
+        added = Event('object:children-changed:add', desktop, self.app)
+        others = Event('object:children-changed:add', desktop, desktop)
+        self.assertEquals(dogtail.utils.startupEventApplication(
+            ours, self.pid, 'gtk3-demo'), self.app)
+        self.assertEquals(dogtail.utils.startupEventApplication(
+            added, self.pid, 'gtk3-demo'), self.app)
+        self.assertEquals(dogtail.utils.startupEventApplication(
+            others, self.pid, 'gtk3-demo'), None)
+
+
+class TestBackoff(unittest.TestCase):
+
+    def test_delays_grow_to_maximum(self):
+        backoff = dogtail.utils.Backoff(timeout=10, initial=0.01, factor=2.0,
+                                        maximum=0.05, jitter=0)
+        self.assertEquals([backoff.next() for i in range(4)],
+                          [0.01, 0.02, 0.04, 0.05])
+
+    def test_warning_due_after_threshold_time(self):
+        backoff = dogtail.utils.Backoff(timeout=10)
+        self.assertFalse(backoff.warningDue())
+        backoff.start -= dogtail.config.config.searchWarningThreshold * \
+            dogtail.config.config.searchBackoffDuration
+        self.assertTrue(backoff.warningDue())
+
+
 class TestA11Y(unittest.TestCase):
 
     def test_bail_when_a11y_disabled(self):